@@ -0,0 +1,78 @@
+'''
+Benchmarks the "drivers of car X" lookup on human_car_association with
+and without its indexes, as one joined query and through the Car.drivers
+association proxy.
+
+    python performance/association_index.py --humans 100000 --links-per-human 10
+'''
+import argparse
+import random
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import sessionmaker
+
+from bench import measure, print_table
+from models.association_object import Base, Car, HumanCarAssociation, Human, drivers_of_car, seed
+
+
+def proxy_drivers(session, car_id):
+    '''
+    The object walk: load the car, its association rows, then each driver.
+    '''
+    return list(session.get(Car, car_id).drivers)
+
+
+SHAPES = {
+    'join': drivers_of_car,
+    'proxy': proxy_drivers,
+}
+
+
+def query_plan(engine, car_id):
+    query = select(Human).join(Human.carsAssoc).where(HumanCarAssociation.car_id == car_id)
+    sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs=dict(literal_binds=True)))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--humans', type=int, default=100000)
+    parser.add_argument('--cars', type=int, default=10000)
+    parser.add_argument('--links-per-human', type=int, default=10)
+    parser.add_argument('--lookups', type=int, default=100)
+    args = parser.parse_args()
+
+    car_ids = random.Random(7).sample(range(1, args.cars + 1), min(args.lookups, args.cars))
+    rows = []
+    for indexed in (True, False):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            seed(conn, args.humans, args.cars, args.links_per_human)
+            if not indexed:
+                for index in HumanCarAssociation.__table__.indexes:
+                    index.drop(conn)
+        label = 'indexed' if indexed else 'unindexed'
+        print('%s plan: %s' % (label, ' / '.join(query_plan(engine, car_ids[0]))))
+
+        Session = sessionmaker(bind=engine)
+        for shape, fn in SHAPES.items():
+            def lookups():
+                session = Session()
+                for car_id in car_ids:
+                    fn(session, car_id)
+                    session.expunge_all()
+                session.close()
+            result = measure(engine, lookups, memory=False)
+            result.update(table=label, shape=shape, ms_per_lookup=result['seconds'] * 1000 / len(car_ids))
+            rows.append(result)
+        engine.dispose()
+
+    print('%s association rows, %s lookups' % (args.humans * args.links_per_human, len(car_ids)))
+    print_table(rows, ['table', 'shape', 'queries', 'seconds', 'ms_per_lookup'])
+
+
+if __name__ == '__main__':
+    main()
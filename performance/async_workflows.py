@@ -0,0 +1,170 @@
+'''
+The one to many (Person/Offence) and many to many (Human/Cat) flows on an
+AsyncSession, plus a benchmark of hundreds of concurrent tasks doing
+get_cats() reads and offence inserts against the same flows on threads.
+
+Every query says what it loads (selectinload) and raiseload('*') turns
+anything else into an error, an implicit lazy load can't run on asyncio
+anyway and this way it fails at the query that forgot it.
+
+    python performance/async_workflows.py --tasks 200 --ops 20
+'''
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker, selectinload, raiseload
+
+from bench import percentile, print_table
+from engines import make_engine, make_async_engine, remove_database
+from models import one_to_many, many_to_many
+
+Person, Offence = one_to_many.Person, one_to_many.Offence
+Human, Cat = many_to_many.Human, many_to_many.Cat
+
+
+def cats_query(human_id):
+    return select(Human).options(selectinload(Human.cats), raiseload('*')).where(Human.id == human_id)
+
+
+def offences_query(person_id):
+    return select(Person).options(selectinload(Person.offences), raiseload('*')).where(Person.id == person_id)
+
+
+async def get_cats(session, human_id):
+    '''
+    get_cats() from the examples, returns (cat_id, cat_name) pairs.
+    '''
+    human_obj = (await session.execute(cats_query(human_id))).scalars().first()
+    return [(cat.id, cat.name) for cat in human_obj.cats]
+
+
+async def get_offences(session, person_id):
+    '''
+    The a_1 offences loop, returns the descriptions.
+    '''
+    person = (await session.execute(offences_query(person_id))).scalars().first()
+    return [offence.description for offence in person.offences]
+
+
+async def add_offence(session, person_id, description):
+    session.add(Offence(description=description, person_id=person_id))
+    await session.commit()
+
+
+def get_cats_sync(session, human_id):
+    human_obj = session.execute(cats_query(human_id)).scalars().first()
+    return [(cat.id, cat.name) for cat in human_obj.cats]
+
+
+def add_offence_sync(session, person_id, description):
+    session.add(Offence(description=description, person_id=person_id))
+    session.commit()
+
+
+def plan(tasks, ops, humans, persons):
+    '''
+    The same work for both runs: a list of ops per task, every third one
+    an insert.
+    '''
+    rand = random.Random(7)
+    return [[('insert', rand.randint(1, persons), 'offence %s.%s' % (t, i)) if i % 3 == 2
+             else ('read', rand.randint(1, humans), None) for i in range(ops)] for t in range(tasks)]
+
+
+async def run_async(engine, work):
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    latencies = []
+
+    async def task(ops):
+        async with Session() as session:
+            for kind, key, description in ops:
+                start = time.perf_counter()
+                if kind == 'read':
+                    await get_cats(session, key)
+                else:
+                    await add_offence(session, key, description)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[task(ops) for ops in work])
+    return time.perf_counter() - start, latencies
+
+
+def run_threads(engine, work, threads):
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    latencies = []
+
+    def task(ops):
+        with Session() as session:
+            for kind, key, description in ops:
+                start = time.perf_counter()
+                if kind == 'read':
+                    get_cats_sync(session, key)
+                else:
+                    add_offence_sync(session, key, description)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(task, ops) for ops in work]:
+            future.result()
+    return time.perf_counter() - start, latencies
+
+
+def seed(path, humans, persons):
+    '''
+    A fresh WAL database file with humans, cats and persons in it.
+    '''
+    engine = make_engine('wal', path)
+    one_to_many.Base.metadata.create_all(bind=engine)
+    many_to_many.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        many_to_many.seed(conn, humans, humans, 10)
+        conn.execute(Person.__table__.insert(), [dict(id=i, name='person %s' % i) for i in range(1, persons + 1)])
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--ops', type=int, default=20, help='operations per task')
+    parser.add_argument('--threads', type=int, default=32, help='worker threads for the sync run')
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--humans', type=int, default=10000)
+    parser.add_argument('--persons', type=int, default=1000)
+    parser.add_argument('--path', default=os.path.join(tempfile.gettempdir(), 'async_workflows.db'))
+    args = parser.parse_args()
+
+    work = plan(args.tasks, args.ops, args.humans, args.persons)
+    pool = dict(pool_size=args.pool_size, max_overflow=args.pool_size, pool_timeout=300,
+                connect_args=dict(timeout=60))
+    rows = []
+
+    seed(args.path, args.humans, args.persons)
+    engine = make_engine('wal', args.path, reset=False, pool='queue', **pool)
+    seconds, latencies = run_threads(engine, work, args.threads)
+    rows.append(dict(mode='threads x%s' % args.threads, seconds=seconds, ops_per_sec=len(latencies) / seconds,
+                     p50_ms=percentile(latencies, 50) * 1000, p99_ms=percentile(latencies, 99) * 1000))
+    engine.dispose()
+
+    seed(args.path, args.humans, args.persons)
+    async_engine = make_async_engine('wal', args.path, reset=False, **pool)
+    seconds, latencies = asyncio.run(run_async(async_engine, work))
+    asyncio.run(async_engine.dispose())
+    rows.append(dict(mode='asyncio x%s' % args.tasks, seconds=seconds, ops_per_sec=len(latencies) / seconds,
+                     p50_ms=percentile(latencies, 50) * 1000, p99_ms=percentile(latencies, 99) * 1000))
+    remove_database(args.path)
+
+    print('%s tasks, %s ops each, one in three an offence insert' % (args.tasks, args.ops))
+    print_table(rows, ['mode', 'seconds', 'ops_per_sec', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+'''
+What keeping both sides of a relationship in sync costs per append, and a
+bulk population mode that builds both sides without per item events.
+
+`person.offences.append(offence)` fires a collection append event, with
+back_populates/backref (a_2/a_3, d_2/d_3) that sets `offence.person` or
+appends to `cat.humans`, which fires the events of the other side. For
+each variant of models.variants the benchmark times those appends and
+measures the memory they leave behind, then builds the same graph with
+`populate()`: foreign keys (or hc_mapper rows through bulk_links.link())
+are written directly and both sides are set with set_committed_value, no
+events and no history.
+
+    populate(session, Person.offences, [(person, [offence, ...]), ...])
+    populate(session, Human.cats, [(human, [cat, ...]), ...])
+    session.commit()
+
+    python performance/backref_cost.py --sizes 100000 1000000
+'''
+import argparse
+import time
+from collections import defaultdict
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bench import peak_memory, print_table
+from bulk_links import link
+from models.variants import VARIANTS, build
+
+RELATIONS = ('one_to_many', 'many_to_many')
+
+
+def _add(session, objects):
+    '''
+    Adds objects to the session, flushing when some of them still need
+    a primary key.
+    '''
+    session.add_all(objects)
+    if any(obj.id is None for obj in objects):
+        session.flush()
+
+
+def populate(session, relationship, graph, chunk_size=10000):
+    '''
+    Builds relationship for graph, (parent, [children]) pairs, without the
+    per item collection and backref events of append(). Both sides end up
+    loaded and the rows (foreign keys or link rows) end up written by the
+    next flush, or by this call for a secondary table.
+
+    Meant for objects being created: the collections are replaced, not
+    added to, and parents without ids are flushed to get one.
+    '''
+    prop = relationship.property
+    graph = [(parent, list(children)) for parent, children in graph]
+    _add(session, [parent for parent, _ in graph])
+    reverse = prop.back_populates
+
+    if prop.secondary is None:
+        for parent, children in graph:
+            for local, remote in prop.synchronize_pairs:
+                value = getattr(parent, local.key)
+                for child in children:
+                    setattr(child, remote.key, value)
+            session.add_all(children)
+            set_committed_value(parent, prop.key, children)
+            if reverse:
+                for child in children:
+                    set_committed_value(child, reverse, parent)
+        return
+
+    # link() flushes the children before writing the link rows
+    session.add_all(set(child for _, children in graph for child in children))
+    link(session, relationship, ((parent.id, child.id) for parent, children in graph for child in children),
+         chunk_size, sync=False)
+    by_child = defaultdict(list)
+    for parent, children in graph:
+        set_committed_value(parent, prop.key, children)
+        if reverse:
+            for child in children:
+                by_child[child].append(parent)
+    for child, child_parents in by_child.items():
+        set_committed_value(child, reverse, child_parents)
+
+
+def _graph(models, relation, items, per_parent):
+    '''
+    items children spread over parents, per_parent each, with ids given
+    up front so neither mode has to flush to get them.
+    '''
+    parents = max(items // per_parent, 1)
+    if relation == 'one_to_many':
+        persons = [models.Person(id=i + 1, name='person %s' % i) for i in range(parents)]
+        offences = [models.Offence(id=i + 1, description='offence %s' % i) for i in range(items)]
+        return models.Person.offences, [(person, offences[i * per_parent:(i + 1) * per_parent])
+                                         for i, person in enumerate(persons)]
+    # every cat is shared by per_parent humans
+    cats = [models.Cat(id=i + 1, name='cat %s' % i) for i in range(parents)]
+    humans = [models.Human(id=i + 1, name='human %s' % i) for i in range(parents)]
+    return models.Human.cats, [(human, [cats[(h + i) % parents] for i in range(per_parent)])
+                                for h, human in enumerate(humans)]
+
+
+def append_all(session, relationship, graph):
+    '''
+    What the examples do, one append per child.
+    '''
+    for parent, children in graph:
+        session.add(parent)
+        collection = getattr(parent, relationship.key)
+        for child in children:
+            collection.append(child)
+
+
+def _run(variant, relation, mode, items, per_parent, memory):
+    models = build(variant)
+    engine = create_engine('sqlite://')
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    relationship, graph = _graph(models, relation, items, per_parent)
+    fn = append_all if mode == 'append' else populate
+    result = {}
+    if memory:
+        with peak_memory() as mem:
+            fn(session, relationship, graph)
+        result['bytes'] = mem['peak'] / float(items)
+    else:
+        start = time.perf_counter()
+        fn(session, relationship, graph)
+        result['build'] = time.perf_counter() - start
+        start = time.perf_counter()
+        session.commit()
+        result['commit'] = time.perf_counter() - start
+        # rows that made it to the database with both ends there
+        if relation == 'one_to_many':
+            written = models.Offence.__table__.join(models.Person.__table__)
+        else:
+            written = models.hc_mapper.join(models.Human.__table__).join(models.Cat.__table__)
+        with engine.connect() as conn:
+            result['written'] = conn.execute(select(func.count()).select_from(written)).scalar()
+    session.close()
+    engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000], help='children (links) per run')
+    parser.add_argument('--per-parent', type=int, default=10, help='children of each parent')
+    parser.add_argument('--variants', choices=VARIANTS, nargs='+', default=list(VARIANTS))
+    parser.add_argument('--relations', choices=RELATIONS, nargs='+', default=list(RELATIONS))
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    args = parser.parse_args()
+
+    rows = []
+    for relation in args.relations:
+        for items in args.sizes:
+            for variant in args.variants:
+                for mode in ('append', 'populate'):
+                    # timed without tracemalloc, then again for memory
+                    result = _run(variant, relation, mode, items, args.per_parent, False)
+                    assert result['written'] == items, result
+                    if not args.no_memory:
+                        result.update(_run(variant, relation, mode, items, args.per_parent, True))
+                    rows.append(dict(relation=relation, variant=variant, mode=mode, items=items,
+                                     us_per_item='%.2f' % (result['build'] * 1e6 / items),
+                                     bytes_per_item='%.0f' % result['bytes'] if 'bytes' in result else None,
+                                     commit_s='%.2f' % result['commit'],
+                                     total_s='%.2f' % (result['build'] + result['commit'])))
+    print_table(rows, ['relation', 'variant', 'mode', 'items', 'us_per_item', 'bytes_per_item',
+                       'commit_s', 'total_s'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Small helpers shared by the benchmark scripts: statement counting,
+timing, peak memory and a plain text report table.
+'''
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class StatementCounter(object):
+    '''
+    Counts the statements an engine sends to the driver, an executemany
+    counts as one statement since it is one round trip.
+    '''
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+@contextmanager
+def peak_memory():
+    '''
+    Yields a dict that holds the tracemalloc peak (in bytes) once the
+    block has finished.
+    '''
+    result = {}
+    tracemalloc.start()
+    try:
+        yield result
+    finally:
+        result['peak'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def measure(engine, fn, memory=True):
+    '''
+    Runs fn() and returns the statements it issued, the wall time and
+    (on a second run) its peak python memory. The timed run is done
+    without tracemalloc since tracing slows everything down.
+    '''
+    with StatementCounter(engine) as counter:
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+    result = dict(queries=counter.count, seconds=seconds, peak_kb=None)
+    if memory:
+        with peak_memory() as mem:
+            fn()
+        result['peak_kb'] = mem['peak'] / 1024.0
+    return result
+
+
+def percentile(values, pct):
+    '''
+    Nearest rank percentile of values, pct between 0 and 100.
+    '''
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(int(round(pct / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def print_table(rows, columns):
+    '''
+    Prints a list of dicts as a left aligned table.
+    '''
+    def fmt(value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return '%.4f' % value
+        return str(value)
+
+    cells = [[fmt(row.get(c)) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    print(' | '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    print('-+-'.join('-' * w for w in widths))
+    for r in cells:
+        print(' | '.join(v.ljust(w) for v, w in zip(r, widths)))
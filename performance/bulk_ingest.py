@@ -0,0 +1,143 @@
+'''
+Bulk ingest for Person/Offence that skips the ORM unit of work, plus a
+benchmark against the session.add_all() approach from a_1.
+
+    python performance/bulk_ingest.py --sizes 10000 100000 1000000
+'''
+import argparse
+import time
+from itertools import islice
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from models.one_to_many import Base, Person, Offence
+
+# sqlite allows 32766 bound parameters per statement, an offence row uses two
+MAX_VALUES_ROWS = 16000
+
+
+def chunks(iterable, size):
+    '''
+    Yields lists of at most size items from any iterable.
+    '''
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _unpack(record):
+    '''
+    Accepts (person_name, description) tuples or dicts with those keys.
+    '''
+    if isinstance(record, dict):
+        return record.get('person_name'), record['description']
+    return record[0], record[1]
+
+
+def _insert(connection, table, rows, multi_values):
+    if multi_values:
+        # one INSERT .. VALUES (..), (..) statement per slice
+        for part in chunks(rows, MAX_VALUES_ROWS):
+            connection.execute(insert(table).values(part))
+    else:
+        # a single executemany
+        connection.execute(insert(table), rows)
+
+
+def ingest(connection, records, batch_size=10000, multi_values=False):
+    '''
+    Inserts offences with core statements in batches of batch_size.
+
+    records are (person_name, description) tuples or dicts, persons that
+    don't exist yet are created. Person ids are resolved from one query
+    up front and new ids are handed out client side, so there is never a
+    query per person and no ORM objects are built. A person_name of None
+    logs the offence against nobody, just like offence3 in a_1.
+
+    Returns the number of offences inserted.
+    '''
+    known = dict(connection.execute(select(Person.name, Person.id)).all())
+    next_id = (connection.execute(select(func.max(Person.id))).scalar() or 0) + 1
+    total = 0
+    for batch in chunks(records, batch_size):
+        new_persons = []
+        offences = []
+        for record in batch:
+            name, description = _unpack(record)
+            person_id = None
+            if name is not None:
+                person_id = known.get(name)
+                if person_id is None:
+                    person_id = known[name] = next_id
+                    next_id += 1
+                    new_persons.append(dict(id=person_id, name=name))
+            offences.append(dict(description=description, person_id=person_id))
+        if new_persons:
+            _insert(connection, Person.__table__, new_persons, multi_values)
+        _insert(connection, Offence.__table__, offences, multi_values)
+        total += len(offences)
+    return total
+
+
+def ingest_add_all(session, records):
+    '''
+    The a_1 way: build Person and Offence objects and let the unit of work
+    sort out the foreign keys.
+    '''
+    persons = {}
+    offences = []
+    for record in records:
+        name, description = _unpack(record)
+        offence = Offence(description=description)
+        if name is not None:
+            person = persons.get(name)
+            if person is None:
+                person = persons[name] = Person(name=name)
+            person.offences.append(offence)
+        offences.append(offence)
+    session.add_all(list(persons.values()) + offences)
+    session.commit()
+    return len(offences)
+
+
+def make_records(size, offences_per_person=10):
+    return [('person %s' % (i // offences_per_person), 'offence %s' % i) for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        records = make_records(size)
+        for mode in ('add_all', 'executemany', 'multi_values'):
+            engine = create_engine('sqlite://')
+            Base.metadata.create_all(bind=engine)
+            start = time.perf_counter()
+            if mode == 'add_all':
+                session = sessionmaker(bind=engine)()
+                ingest_add_all(session, records)
+                session.close()
+            else:
+                with engine.begin() as conn:
+                    ingest(conn, records, args.batch_size, multi_values=mode == 'multi_values')
+            seconds = time.perf_counter() - start
+            with engine.connect() as conn:
+                count = conn.execute(select(func.count()).select_from(Offence)).scalar()
+            assert count == size, (mode, count)
+            rows.append(dict(rows=size, mode=mode, seconds=seconds, rows_per_sec=int(size / seconds)))
+            engine.dispose()
+
+    print_table(rows, ['rows', 'mode', 'seconds', 'rows_per_sec'])
+
+
+if __name__ == '__main__':
+    main()
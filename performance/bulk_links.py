@@ -0,0 +1,218 @@
+'''
+Bulk link/unlink for many to many relationships such as Human.cats.
+
+`libre.cats.extend([...])` fires collection and backref events for every
+cat and the flush then works out one hc_mapper row per link. `link()`
+takes (human_id, cat_id) pairs and writes them straight into the
+secondary table with chunked executemany, pairs that already exist are
+skipped. `unlink()` deletes them the same way. With sync=True collections
+already loaded in the session are brought up to date without events.
+
+    link(session, Human.cats, [(1, 2), (1, 3), (2, 3)])
+    unlink(session, Human.cats, [(1, 2)])
+    session.commit()
+
+    python performance/bulk_links.py --pairs 1000000
+'''
+import argparse
+import time
+from collections import defaultdict
+
+from sqlalchemy import bindparam, create_engine, delete, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bench import peak_memory, print_table
+from bulk_ingest import chunks
+
+
+def _columns(relationship):
+    '''
+    The secondary table and its columns pointing at the parent and the child.
+    '''
+    prop = relationship.property
+    if prop.secondary is None:
+        raise ValueError('%s is not a many to many relationship' % relationship)
+    return prop.secondary, prop.synchronize_pairs[0][1], prop.secondary_synchronize_pairs[0][1]
+
+
+def _loaded(session, mapper, ids):
+    '''
+    The objects of ids that are in the identity map, by id.
+    '''
+    found = {}
+    for ident in ids:
+        obj = session.identity_map.get(mapper.identity_key_from_primary_key((ident,)))
+        if obj is not None:
+            found[ident] = obj
+    return found
+
+
+def _sync_side(session, relationship, pairs, add):
+    '''
+    Updates relationship on the loaded parents of pairs, (parent id, child
+    id) tuples. A parent whose new children are not all in the session
+    gets the attribute expired and reloads it on next access instead.
+    '''
+    prop = relationship.property
+    by_parent = defaultdict(set)
+    for parent_id, child_id in pairs:
+        by_parent[parent_id].add(child_id)
+    parents = _loaded(session, prop.parent, by_parent)
+    for parent_id, parent in parents.items():
+        if prop.key not in parent.__dict__:
+            continue  # not loaded, it will be read fresh anyway
+        child_ids = by_parent[parent_id]
+        current = parent.__dict__[prop.key]
+        if add:
+            children = _loaded(session, prop.mapper, child_ids)
+            if len(children) < len(child_ids):
+                session.expire(parent, [prop.key])
+                continue
+            have = set(inspect(child).identity[0] for child in current)
+            value = list(current) + [children[i] for i in child_ids if i not in have]
+        else:
+            value = [child for child in current if inspect(child).identity[0] not in child_ids]
+        # no events, no history: the rows are already written
+        set_committed_value(parent, prop.key, value)
+
+
+def _sync(session, relationship, pairs, add):
+    _sync_side(session, relationship, pairs, add)
+    prop = relationship.property
+    if prop.back_populates:
+        reverse = getattr(prop.mapper.class_, prop.back_populates)
+        _sync_side(session, reverse, [(child, parent) for parent, child in pairs], add)
+
+
+def _unique(pairs):
+    seen = set()
+    for pair in pairs:
+        pair = tuple(pair)
+        if pair not in seen:
+            seen.add(pair)
+            yield pair
+
+
+def link(session, relationship, pairs, chunk_size=10000, sync=True):
+    '''
+    Inserts the (parent id, child id) pairs into relationship's secondary
+    table in chunks of chunk_size, in the session's transaction. Pairs that
+    are already linked (or repeated) are skipped. Returns how many links
+    were added.
+
+    Pending changes are flushed first so the collections and the table
+    agree. sync=False leaves loaded collections stale, expire them or
+    start a new session before reading them.
+    '''
+    table, parent_column, child_column = _columns(relationship)
+    session.flush()
+    # INSERT OR IGNORE, the primary key on the pair decides what exists
+    statement = insert(table).on_conflict_do_nothing()
+    added = 0
+    for part in chunks(_unique(pairs), chunk_size):
+        result = session.execute(statement, [{parent_column.key: p, child_column.key: c} for p, c in part])
+        added += result.rowcount
+        if sync:
+            _sync(session, relationship, part, add=True)
+    return added
+
+
+def unlink(session, relationship, pairs, chunk_size=10000, sync=True):
+    '''
+    Deletes the (parent id, child id) pairs from the secondary table in
+    chunks of chunk_size. Returns how many links were removed.
+    '''
+    table, parent_column, child_column = _columns(relationship)
+    session.flush()
+    statement = delete(table).where(parent_column == bindparam('_parent'), child_column == bindparam('_child'))
+    removed = 0
+    for part in chunks(_unique(pairs), chunk_size):
+        result = session.execute(statement, [dict(_parent=p, _child=c) for p, c in part])
+        removed += result.rowcount
+        if sync:
+            _sync(session, relationship, part, add=False)
+    return removed
+
+
+def main():
+    from models.many_to_many import Base, Human, Cat, hc_mapper, seed
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=1000000)
+    parser.add_argument('--per-human', type=int, default=10, help='cats linked to each human')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--skip-extend', action='store_true', help='only time link()/unlink()')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    args = parser.parse_args()
+
+    humans = args.pairs // args.per_human
+    cats = max(humans // 10, args.per_human)
+    pairs = [(h, (h * 7 + i * 13) % cats + 1) for h in range(1, humans + 1) for i in range(args.per_human)]
+    rows = []
+
+    def fresh():
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            seed(conn, humans, cats, 0)
+        return engine, sessionmaker(bind=engine)()
+
+    def extend(session):
+        # what d_1 does: load the objects and extend the collections
+        loaded_cats = dict((cat.id, cat) for cat in session.query(Cat))
+        by_human = defaultdict(list)
+        for h, c in pairs:
+            by_human[h].append(loaded_cats[c])
+        for human in session.query(Human):
+            human.cats.extend(by_human[human.id])
+        session.commit()
+        return len(pairs)
+
+    def linked(session):
+        link(session, Human.cats, pairs, args.chunk_size)
+        session.commit()
+
+    def bulk(fn, links):
+        def run(session):
+            changed = fn(session, Human.cats, links, args.chunk_size)
+            session.commit()
+            return changed
+        return run
+
+    cases = [
+        ('link()', None, bulk(link, pairs)),
+        ('link() again, all skipped', linked, bulk(link, pairs)),
+        ('unlink() half', linked, bulk(unlink, pairs[::2])),
+    ]
+    if not args.skip_extend:
+        cases.insert(0, ('extend()', None, extend))
+    for approach, setup, run in cases:
+        # timed without tracemalloc, then again on a fresh copy for memory
+        engine, session = fresh()
+        if setup:
+            setup(session)
+        start = time.perf_counter()
+        changed = run(session)
+        seconds = time.perf_counter() - start
+        session.close()
+        with engine.connect() as conn:
+            links = conn.execute(select(func.count()).select_from(hc_mapper)).scalar()
+        peak = None
+        if not args.no_memory:
+            engine, session = fresh()
+            if setup:
+                setup(session)
+            with peak_memory() as mem:
+                run(session)
+            session.close()
+            peak = '%.1f' % (mem['peak'] / 1048576.0)
+        rows.append(dict(approach=approach, links=links, changed=changed, seconds='%.2f' % seconds,
+                         pairs_per_s='%.0f' % (len(pairs) / seconds), peak_mb=peak))
+
+    print_table(rows, ['approach', 'links', 'changed', 'seconds', 'pairs_per_s', 'peak_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Benchmarks deleting a human as its collection of cats grows, with the
+ORM cleaning up hc_mapper (d_6) and with ON DELETE CASCADE plus
+passive_deletes (models/many_to_many_passive.py), and checks that no
+link rows are left dangling either way.
+
+    python performance/cascade_delete.py --sizes 10 100 1000 10000 100000
+'''
+import argparse
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from bench import StatementCounter, print_table
+from engines import make_engine
+from models import many_to_many, many_to_many_passive
+
+MODES = (
+    ('orm', many_to_many, False),
+    ('passive', many_to_many_passive, True),
+)
+
+
+def build(models, size, foreign_keys):
+    '''
+    Two humans sharing size cats, human 1 is the one that gets deleted.
+    '''
+    engine = make_engine('memory', foreign_keys=foreign_keys)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.Human.__table__.insert(), [dict(id=1, name='LibreLad'), dict(id=2, name='LibreLas')])
+        conn.execute(models.Cat.__table__.insert(), [dict(id=i, name='cat %s' % i) for i in range(1, size + 1)])
+        conn.execute(models.hc_mapper.insert(),
+                     [dict(human_id=h, cat_id=i) for h in (1, 2) for i in range(1, size + 1)])
+    return engine
+
+
+def dangling_links(connection, models):
+    '''
+    Link rows pointing at a human or cat that no longer exists.
+    '''
+    hc_mapper = models.hc_mapper
+    return connection.execute(
+        select(func.count()).select_from(hc_mapper).where(
+            ~hc_mapper.c.human_id.in_(select(models.Human.id)) |
+            ~hc_mapper.c.cat_id.in_(select(models.Cat.id)))
+    ).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        for mode, models, foreign_keys in MODES:
+            engine = build(models, size, foreign_keys)
+            session = sessionmaker(bind=engine)()
+            with StatementCounter(engine) as counter:
+                start = time.perf_counter()
+                session.delete(session.get(models.Human, 1))
+                session.commit()
+                seconds = time.perf_counter() - start
+            session.close()
+            with engine.connect() as conn:
+                dangling = dangling_links(conn, models)
+                remaining = conn.execute(select(func.count()).select_from(models.hc_mapper)).scalar()
+            assert dangling == 0 and remaining == size, (mode, dangling, remaining)
+            rows.append(dict(cats=size, mode=mode, ms=seconds * 1000, statements=counter.count,
+                             dangling=dangling))
+            engine.dispose()
+
+    print_table(rows, ['cats', 'mode', 'ms', 'statements', 'dangling'])
+
+
+if __name__ == '__main__':
+    main()
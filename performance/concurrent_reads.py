@@ -0,0 +1,108 @@
+'''
+Multi threaded read benchmark: N workers with a scoped_session each run
+get_cats() style lookups against a file backed sqlite database, for
+every pool class in engines.POOLS. Reports throughput, p50/p99 latency
+and how long the workers waited to check out a connection.
+
+    python performance/concurrent_reads.py --threads 1 4 16 --pool-size 5 --max-overflow 10
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import scoped_session, sessionmaker, selectinload
+
+from bench import percentile, print_table
+from engines import POOLS, make_engine, remove_database
+from models.many_to_many import Base, Human, seed
+
+
+def worker(Session, human_ids, latencies, waits):
+    '''
+    Runs one lookup per human id, timing the connection checkout on its own.
+    '''
+    session = Session()
+    try:
+        for human_id in human_ids:
+            start = time.perf_counter()
+            session.connection()
+            checked_out = time.perf_counter()
+            human_obj = session.query(Human).options(selectinload(Human.cats)) \
+                .filter(Human.id == human_id).first()
+            for cat in human_obj.cats:
+                cat.name
+            # hand the connection back to the pool between lookups
+            session.close()
+            done = time.perf_counter()
+            waits.append(checked_out - start)
+            latencies.append(done - start)
+    finally:
+        Session.remove()
+
+
+def run(engine, threads, ops_per_thread, humans):
+    Session = scoped_session(sessionmaker(bind=engine))
+    rand = random.Random(7)
+    work = [[rand.randint(1, humans) for _ in range(ops_per_thread)] for _ in range(threads)]
+    latencies, waits = [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, Session, ids, latencies, waits) for ids in work]:
+            future.result()
+    seconds = time.perf_counter() - start
+    return dict(
+        ops_per_sec=len(latencies) / seconds,
+        p50_ms=percentile(latencies, 50) * 1000,
+        p99_ms=percentile(latencies, 99) * 1000,
+        wait_p50_ms=percentile(waits, 50) * 1000,
+        wait_p99_ms=percentile(waits, 99) * 1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--pools', nargs='+', default=list(POOLS), choices=list(POOLS))
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--max-overflow', type=int, default=10)
+    parser.add_argument('--config', default='wal', choices=('file', 'wal'))
+    parser.add_argument('--ops', type=int, default=500, help='lookups per thread')
+    parser.add_argument('--humans', type=int, default=10000)
+    parser.add_argument('--links-per-human', type=int, default=10)
+    parser.add_argument('--path', default=os.path.join(tempfile.gettempdir(), 'concurrent_reads.db'))
+    args = parser.parse_args()
+
+    engine = make_engine(args.config, args.path)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        seed(conn, args.humans, args.humans, args.links_per_human)
+    engine.dispose()
+
+    rows = []
+    for pool in args.pools:
+        for threads in args.threads:
+            if pool == 'static' and threads > 1:
+                # one shared sqlite connection is not safe to use from
+                # several threads at once, its numbers would mean nothing
+                rows.append(dict(pool=pool, threads=threads, ops_per_sec='skipped, single connection'))
+                continue
+            # SingletonThreadPool closes connections of other threads once
+            # more than pool_size threads show up, while they are in use
+            pool_size = max(args.pool_size, threads) if pool == 'singleton' else args.pool_size
+            # the file is already seeded, don't start from an empty one
+            engine = make_engine(args.config, args.path, pool=pool, pool_size=pool_size,
+                                 max_overflow=args.max_overflow, reset=False)
+            row = dict(pool=pool, threads=threads)
+            row.update(run(engine, threads, args.ops, args.humans))
+            rows.append(row)
+            engine.dispose()
+    remove_database(args.path)
+
+    print_table(rows, ['pool', 'threads', 'ops_per_sec', 'p50_ms', 'p99_ms', 'wait_p50_ms', 'wait_p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+Engine configurations the benchmarks run against.
+
+    memory  sqlite in memory, what every example uses
+    file    sqlite file with the default rollback journal
+    wal     sqlite file in write ahead log mode
+
+and the connection pools they can use.
+
+    queue      QueuePool, pool_size connections plus max_overflow extra
+    static     StaticPool, one connection shared by everybody
+    null       NullPool, a new connection for every checkout
+    singleton  SingletonThreadPool, one connection per thread
+'''
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, StaticPool, NullPool, SingletonThreadPool
+
+CONFIGS = ('memory', 'file', 'wal')
+
+POOLS = {
+    'queue': QueuePool,
+    'static': StaticPool,
+    'null': NullPool,
+    'singleton': SingletonThreadPool,
+}
+
+
+def make_engine(config='memory', path='benchmark.db', foreign_keys=False, pool=None,
+                pool_size=5, max_overflow=10, pool_timeout=30, reset=True, **kwargs):
+    '''
+    Creates an engine for one of CONFIGS, extra kwargs go to create_engine.
+    File configs start from an empty database file at path unless reset
+    is False, foreign_keys switches on sqlite's foreign key enforcement.
+
+    pool picks one of POOLS, pool_size applies to queue and singleton,
+    max_overflow and pool_timeout to queue only. Without a pool the
+    dialect default is used.
+    '''
+    if config not in CONFIGS:
+        raise ValueError('unknown engine config %r, pick one of %s' % (config, ', '.join(CONFIGS)))
+    if pool is not None:
+        if pool not in POOLS:
+            raise ValueError('unknown pool %r, pick one of %s' % (pool, ', '.join(POOLS)))
+        kwargs['poolclass'] = POOLS[pool]
+        if pool in ('queue', 'singleton'):
+            kwargs['pool_size'] = pool_size
+        if pool == 'queue':
+            kwargs.update(max_overflow=max_overflow, pool_timeout=pool_timeout)
+        # pooled sqlite connections get handed from thread to thread
+        kwargs.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+    if config == 'memory':
+        engine = create_engine('sqlite://', **kwargs)
+    else:
+        if reset:
+            remove_database(path)
+        engine = create_engine('sqlite:///%s' % path, **kwargs)
+    if foreign_keys:
+        enable_foreign_keys(engine)
+    if config == 'wal':
+        @event.listens_for(engine, 'connect')
+        def set_wal(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.close()
+    return engine
+
+
+def make_async_engine(config='memory', path='benchmark.db', reset=True, **kwargs):
+    '''
+    The asyncio twin of make_engine() on aiosqlite, the pragmas are set
+    through the sync_engine events like any other engine. Needs the
+    aiosqlite driver installed.
+    '''
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if config not in CONFIGS:
+        raise ValueError('unknown engine config %r, pick one of %s' % (config, ', '.join(CONFIGS)))
+    if config == 'memory':
+        return create_async_engine('sqlite+aiosqlite://', **kwargs)
+    if reset:
+        remove_database(path)
+    engine = create_async_engine('sqlite+aiosqlite:///%s' % path, **kwargs)
+    if config == 'wal':
+        @event.listens_for(engine.sync_engine, 'connect')
+        def set_wal(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.close()
+    return engine
+
+
+def enable_foreign_keys(engine):
+    '''
+    sqlite ignores FOREIGN KEY clauses (ON DELETE CASCADE included) unless
+    every connection turns them on, this does it as each one is opened.
+    '''
+    @event.listens_for(engine, 'connect')
+    def set_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+    return engine
+
+
+def remove_database(path):
+    '''
+    Deletes a sqlite database file along with its journal and WAL files.
+    '''
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
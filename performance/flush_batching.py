@@ -0,0 +1,212 @@
+'''
+Explicit flush batching for loops that mix session.add() with lookups.
+
+a_1 and b_1 add an object and then query, autoflush turns every query
+into a flush of whatever is pending and an ingest loop into thousands of
+one object flushes. Inside `batched()` autoflush is off, new objects are
+flushed together once `max_pending` objects or `max_bytes` of their
+values have piled up, and `lookup()` answers from the pending objects
+first so a row added a moment ago is still found.
+
+    with batched(session, max_pending=1000, keys={Website: 'url'}) as batch:
+        website = batch.lookup(Website, url=url) or batch.add(Website(url=url))
+        batch.add(User(name=name, website=website))
+    session.commit()
+
+    python performance/flush_batching.py --size 20000
+'''
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from bench import StatementCounter, print_table
+
+
+def _approx_size(obj):
+    '''
+    Bytes of the plain values set on obj, relationships and the instance
+    state left out. Good enough to keep a batch of long strings in check.
+    '''
+    return sum(sys.getsizeof(value) for key, value in vars(obj).items()
+               if not key.startswith('_') and isinstance(value, (str, bytes, int, float)))
+
+
+class Batch(object):
+    '''
+    The pending side of a batched() block. keys maps a model to the
+    attribute (or tuple of attributes) lookups use most, objects added
+    in the block are indexed on it (flushed or not, so they don't cost a
+    query either), any other lookup scans the objects not flushed yet.
+    '''
+    def __init__(self, session, max_pending=1000, max_bytes=None, keys=None):
+        self.session = session
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.keys = dict((model, (key,) if isinstance(key, str) else tuple(key))
+                         for model, key in (keys or {}).items())
+        self.flushes = 0
+        self._pending = []
+        self._bytes = 0
+        self._index = {}
+
+    def add(self, obj):
+        '''
+        Adds obj to the session and flushes once a threshold is reached.
+        Returns obj so it can be used inline.
+        '''
+        self.session.add(obj)
+        self._pending.append(obj)
+        key = self.keys.get(type(obj))
+        if key is not None:
+            self._index.setdefault(type(obj), {})[tuple(getattr(obj, k) for k in key)] = obj
+        if self.max_bytes is not None:
+            self._bytes += _approx_size(obj)
+        if len(self._pending) >= self.max_pending or (self.max_bytes is not None and self._bytes >= self.max_bytes):
+            self.flush()
+        return obj
+
+    def flush(self):
+        if self._pending:
+            self.session.flush()
+            self.flushes += 1
+        self._pending = []
+        self._bytes = 0
+
+    def lookup(self, model, **criteria):
+        '''
+        The first object of model matching criteria: a pending object if
+        one matches, otherwise the first row from the database. Only
+        equality on column attributes, like filter_by().
+        '''
+        key = self.keys.get(model)
+        if key is not None and set(criteria) == set(key):
+            found = self._index.get(model, {}).get(tuple(criteria[k] for k in key))
+            if found is not None:
+                return found
+        else:
+            for obj in self._pending:
+                if type(obj) is model and all(getattr(obj, k) == v for k, v in criteria.items()):
+                    return obj
+        return self.session.query(model).filter_by(**criteria).first()
+
+
+@contextmanager
+def batched(session, max_pending=1000, max_bytes=None, keys=None):
+    '''
+    Turns autoflush off for the block and yields a Batch, whatever is
+    still pending is flushed on the way out (not committed).
+    '''
+    batch = Batch(session, max_pending, max_bytes, keys)
+    with session.no_autoflush:
+        yield batch
+        batch.flush()
+
+
+def websites_autoflush(session, size, websites):
+    '''
+    b_1 as a get-or-create loop: find the website by url, add it if it
+    is missing, add the user. Every query autoflushes.
+    '''
+    from models.many_to_one import User, Website
+    for i in range(size):
+        url = 'https://example.com/%s' % (i % websites)
+        website = session.query(Website).filter_by(url=url).first()
+        if website is None:
+            website = Website(url=url)
+            session.add(website)
+        session.add(User(name='user %s' % i, website=website))
+    session.commit()
+
+
+def websites_batched(session, size, websites, max_pending):
+    from models.many_to_one import User, Website
+    with batched(session, max_pending, keys={Website: 'url'}) as batch:
+        for i in range(size):
+            url = 'https://example.com/%s' % (i % websites)
+            website = batch.lookup(Website, url=url) or batch.add(Website(url=url))
+            batch.add(User(name='user %s' % i, website=website))
+    session.commit()
+    return batch
+
+
+def offences_autoflush(session, size, persons):
+    '''
+    a_1 as a get-or-create loop: find the person by name, add them if
+    they are missing, log an offence against them.
+    '''
+    from models.one_to_many import Person, Offence
+    for i in range(size):
+        name = 'person %s' % (i % persons)
+        person = session.query(Person).filter_by(name=name).first()
+        if person is None:
+            person = Person(name=name, offences=[])
+            session.add(person)
+        person.offences.append(Offence(description='offence %s' % i))
+    session.commit()
+
+
+def offences_batched(session, size, persons, max_pending):
+    from models.one_to_many import Person, Offence
+    with batched(session, max_pending, keys={Person: 'name'}) as batch:
+        for i in range(size):
+            name = 'person %s' % (i % persons)
+            person = batch.lookup(Person, name=name) or batch.add(Person(name=name, offences=[]))
+            person.offences.append(batch.add(Offence(description='offence %s' % i)))
+    session.commit()
+    return batch
+
+
+def _check(engine, models, parent, key):
+    '''
+    Rows per table and whether any parent was created twice.
+    '''
+    with engine.connect() as conn:
+        counts = [conn.exec_driver_sql('SELECT count(*) FROM %s' % m.__tablename__).scalar() for m in models]
+        distinct = conn.exec_driver_sql('SELECT count(DISTINCT %s) FROM %s' % (key, parent.__tablename__)).scalar()
+    return counts, distinct == counts[models.index(parent)]
+
+
+def main():
+    from models import one_to_many, many_to_one
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=20000, help='objects added by each loop')
+    parser.add_argument('--parents', type=int, default=1000, help='distinct websites/persons looked up')
+    parser.add_argument('--max-pending', type=int, default=1000)
+    args = parser.parse_args()
+
+    loops = (
+        ('b_1 websites', many_to_one, (many_to_one.User, many_to_one.Website), many_to_one.Website, 'url',
+         lambda s: websites_autoflush(s, args.size, args.parents),
+         lambda s: websites_batched(s, args.size, args.parents, args.max_pending)),
+        ('a_1 offences', one_to_many, (one_to_many.Offence, one_to_many.Person), one_to_many.Person, 'name',
+         lambda s: offences_autoflush(s, args.size, args.parents),
+         lambda s: offences_batched(s, args.size, args.parents, args.max_pending)),
+    )
+    rows = []
+    for name, models, tables, parent, key, autoflush, batch in loops:
+        for mode, fn in (('autoflush', autoflush), ('batched', batch)):
+            engine = create_engine('sqlite://')
+            models.Base.metadata.create_all(bind=engine)
+            flushes = []
+            session = sessionmaker(bind=engine)()
+            event.listen(session, 'after_flush', lambda s, ctx: flushes.append(1))
+            with StatementCounter(engine) as counter:
+                start = time.perf_counter()
+                fn(session)
+                seconds = time.perf_counter() - start
+            session.close()
+            counts, unique = _check(engine, list(tables), parent, key)
+            rows.append(dict(loop=name, mode=mode, flushes=len(flushes), statements=counter.count,
+                             seconds='%.3f' % seconds, rows='/'.join(str(c) for c in counts),
+                             duplicates='no' if unique else 'YES'))
+            engine.dispose()
+    print_table(rows, ['loop', 'mode', 'flushes', 'statements', 'seconds', 'rows', 'duplicates'])
+
+
+if __name__ == '__main__':
+    main()
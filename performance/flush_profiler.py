@@ -0,0 +1,261 @@
+'''
+Unit of work flush profiler.
+
+Hooks before_flush, after_cursor_execute and after_flush_postexec and
+keeps one record per flush: what triggered it (autoflush, commit or an
+explicit flush) and from where, the objects by state and mapper, the
+statements per table with the rows they carried, and the wall time.
+Tables whose INSERTs went out one row per statement are the mappers
+that stop the unit of work from batching.
+
+    profiler = FlushProfiler()
+    with profiler:
+        session.commit()
+    print(profiler.report())
+
+    python performance/flush_profiler.py --size 1000 --output flushes.json
+'''
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from bench import print_table
+from nplusone import call_site
+
+# sqlalchemy.orm functions that call flush() themselves, anything else is
+# an explicit flush()
+_TRIGGERS = {'_autoflush': 'autoflush', 'commit': 'commit'}
+
+
+def _trigger():
+    '''
+    What started the flush: the innermost of _TRIGGERS on the stack,
+    looking only at sqlalchemy.orm's own frames so a function of the
+    application named commit() doesn't count.
+    '''
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get('__name__', '').startswith('sqlalchemy.orm'):
+            trigger = _TRIGGERS.get(frame.f_code.co_name)
+            if trigger is not None:
+                return trigger
+        frame = frame.f_back
+    return 'flush'
+
+
+def _by_mapper(objects):
+    return dict(Counter(type(obj).__name__ for obj in objects))
+
+
+def _rows(parameters, context, executemany):
+    '''
+    Rows one cursor execution carried: executemany gets a list of
+    parameter sets, an insertmanyvalues batch gets every row's parameters
+    flattened into one tuple.
+    '''
+    if isinstance(parameters, list):
+        return len(parameters)
+    if executemany and context is not None and context.compiled_parameters:
+        per_row = len(context.compiled_parameters[0])
+        return len(parameters) // per_row if per_row else 1
+    return 1
+
+
+class FlushRecord(object):
+    '''
+    One flush: objects by state, statements per (table, verb) and timing.
+    '''
+    def __init__(self, number, trigger, call_site, session):
+        self.number = number
+        self.trigger = trigger
+        self.call_site = call_site
+        self.new = _by_mapper(session.new)
+        self.dirty = _by_mapper(session.dirty)
+        self.deleted = _by_mapper(session.deleted)
+        self.tables = OrderedDict()
+        self.seconds = None
+        self._start = time.perf_counter()
+
+    def add(self, table, verb, rows):
+        stats = self.tables.setdefault((table, verb), dict(statements=0, rows=0))
+        stats['statements'] += 1
+        stats['rows'] += rows
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+
+    @property
+    def statements(self):
+        return sum(stats['statements'] for stats in self.tables.values())
+
+    def unbatched(self):
+        '''
+        Tables whose INSERTs went out one statement per row.
+        '''
+        return [table for (table, verb), stats in self.tables.items()
+                if verb == 'insert' and stats['rows'] > 1 and stats['statements'] == stats['rows']]
+
+    def to_dict(self):
+        return dict(
+            flush=self.number, trigger=self.trigger, call_site=self.call_site, seconds=self.seconds,
+            new=self.new, dirty=self.dirty, deleted=self.deleted, statements=self.statements,
+            tables=[dict(table=table, verb=verb, statements=stats['statements'], rows=stats['rows'],
+                         rows_per_statement=float(stats['rows']) / stats['statements'])
+                    for (table, verb), stats in self.tables.items()],
+            unbatched=self.unbatched())
+
+
+class FlushProfiler(object):
+    '''
+    Listens on every Session and Engine by default, pass a sessionmaker,
+    session or engine to narrow it down. Statements are attributed to
+    the flush running on the same thread.
+    '''
+    def __init__(self, session_target=Session, engine_target=Engine):
+        self.session_target = session_target
+        self.engine_target = engine_target
+        self.flushes = []
+        self._local = threading.local()
+
+    def _before_flush(self, session, flush_context, instances):
+        record = FlushRecord(len(self.flushes) + 1, _trigger(), call_site(), session)
+        self.flushes.append(record)
+        self._local.current = record
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        record = getattr(self._local, 'current', None)
+        if record is None:
+            return
+        compiled = context.compiled.statement if context is not None and context.compiled is not None else None
+        table = getattr(getattr(compiled, 'table', None), 'name', None)
+        verb = compiled.__visit_name__ if table is not None else statement.split(None, 1)[0].lower()
+        record.add(table, verb, _rows(parameters, context, executemany))
+
+    def _after_flush_postexec(self, session, flush_context):
+        record = getattr(self._local, 'current', None)
+        if record is not None:
+            record.finish()
+            self._local.current = None
+
+    def __enter__(self):
+        event.listen(self.session_target, 'before_flush', self._before_flush)
+        event.listen(self.session_target, 'after_flush_postexec', self._after_flush_postexec)
+        event.listen(self.engine_target, 'after_cursor_execute', self._after_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.session_target, 'before_flush', self._before_flush)
+        event.remove(self.session_target, 'after_flush_postexec', self._after_flush_postexec)
+        event.remove(self.engine_target, 'after_cursor_execute', self._after_cursor_execute)
+        # a flush that raised never reaches after_flush_postexec
+        self._local.current = None
+
+    def to_json(self, **kwargs):
+        return json.dumps([record.to_dict() for record in self.flushes], **kwargs)
+
+    def report(self):
+        '''
+        One line per flush followed by every table's statements and
+        batching summed over all flushes.
+        '''
+        def states(record):
+            return ' '.join('%s:%s' % (state, sum(getattr(record, state).values()))
+                            for state in ('new', 'dirty', 'deleted'))
+
+        lines = ['%s flushes' % len(self.flushes)]
+        for record in self.flushes:
+            lines.append('  #%s %s at %s: %s, %s statements, %.4fs' % (
+                record.number, record.trigger, record.call_site, states(record),
+                record.statements, record.seconds or 0))
+        totals = OrderedDict()
+        for record in self.flushes:
+            for key, stats in record.tables.items():
+                total = totals.setdefault(key, dict(statements=0, rows=0))
+                total['statements'] += stats['statements']
+                total['rows'] += stats['rows']
+        lines.append('statements per table:')
+        for (table, verb), stats in totals.items():
+            note = ''
+            if verb == 'insert' and stats['rows'] > 1 and stats['statements'] == stats['rows']:
+                note = '  <- one INSERT per row'
+            lines.append('  %-28s %-7s %7s statements %9s rows %8.1f rows/statement%s' % (
+                table, verb, stats['statements'], stats['rows'],
+                float(stats['rows']) / stats['statements'], note))
+        return '\n'.join(lines)
+
+
+def a_1_flushes(Session, size, ids=False):
+    '''
+    a_1: a pending person autoflushed by the name lookup, then the
+    offences added and committed.
+    '''
+    from models.one_to_many import Person, Offence
+    session = Session()
+    people = [Person(name='person %s' % i, id=i + 1 if ids else None) for i in range(size)]
+    session.add_all(people)
+    lad = session.query(Person).filter(Person.name == 'person 0').first()
+    session.add_all([Offence(description='offence %s.%s' % (i, j), person_id=lad.id if i == 0 else person.id,
+                             id=i * 3 + j + 1 if ids else None)
+                     for i, person in enumerate(people) for j in range(3)])
+    session.commit()
+    session.close()
+
+
+def d_1_flushes(Session, size, ids=False):
+    '''
+    d_1: humans, cats and link rows all flushed by one commit, then a
+    cat removed from a human.
+    '''
+    from models.many_to_many import Human, Cat
+    session = Session()
+    cats = [Cat(name='cat %s' % i, id=i + 1 if ids else None) for i in range(size)]
+    for i in range(size):
+        human = Human(name='human %s' % i, id=i + 1 if ids else None)
+        human.cats.extend([cats[(i + j) % size] for j in range(3)])
+        session.add(human)
+    session.commit()
+    human_obj = session.get(Human, 1)
+    human_obj.cats.remove(human_obj.cats[0])
+    session.commit()
+    session.close()
+
+
+def main():
+    from models import one_to_many, many_to_many
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--ids', action='store_true', help='assign primary keys up front')
+    parser.add_argument('--output', help='write every flush as JSON, - for stdout')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    one_to_many.Base.metadata.create_all(bind=engine)
+    many_to_many.Base.metadata.create_all(bind=engine)
+    profiler = FlushProfiler(engine_target=engine)
+    with profiler:
+        a_1_flushes(sessionmaker(bind=engine), args.size, args.ids)
+        d_1_flushes(sessionmaker(bind=engine), args.size, args.ids)
+
+    if args.output == '-':
+        print(profiler.to_json(indent=2))
+        return
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(profiler.to_json(indent=2))
+    print(profiler.report())
+    print('')
+    print_table([dict(flush=r.number, trigger=r.trigger, statements=r.statements,
+                      seconds='%.4f' % r.seconds, unbatched=', '.join(r.unbatched()) or '-')
+                 for r in profiler.flushes], ['flush', 'trigger', 'statements', 'seconds', 'unbatched'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+'''
+Exports a link table (hc_mapper, human_car_association) into NumPy CSR
+and CSC arrays for whole graph questions: how many cats per human, which
+humans share cats (A.A^T) and the top k of either, vectorized instead of
+walking human_obj.cats and cat_obj.humans object by object.
+
+    graph = Adjacency.from_links(session, hc_mapper.c.human_id, hc_mapper.c.cat_id)
+    graph.degree(), graph.top_k(10), graph.co_owners(1)
+    graph.refresh(session)  # picks up links added (or removed) since
+
+    python performance/graph_export.py --humans 100000 --cats 20000 --links 5
+'''
+import argparse
+import time
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import Integer, create_engine, func, literal_column, select
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from models import many_to_many, association_object
+
+
+def _compress(major, minor, size):
+    '''
+    indptr and indices of the (major, minor) index pairs sorted by major
+    then minor, CSR when major are rows and CSC when it is the columns.
+    '''
+    order = np.lexsort((minor, major))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(major, minlength=size), out=indptr[1:])
+    return indptr, minor[order].astype(np.int32)
+
+
+# refresh() notices changed rows by (count, sum of hash) of every
+# (sequence, row, column) for two hashes, summed in sqlite and numpy alike.
+# Values stay below 2**31 so neither the products nor the sums overflow
+_MODULUS = 2147483647
+_MULTIPLIERS = (1000003, 999983)
+
+
+def _hash(sequence, row, col, multiplier):
+    '''
+    A link's hash, for numpy arrays and sql columns both.
+    '''
+    return (((sequence % _MODULUS) * multiplier + row) % _MODULUS * multiplier + col) % _MODULUS
+
+
+def _checksum(seen, rows, cols):
+    return (len(rows),) + tuple(int(_hash(seen, rows, cols, multiplier).sum()) for multiplier in _MULTIPLIERS)
+
+
+def _segments(indptr, indices, positions):
+    '''
+    indices of every major position in positions concatenated, without a
+    python loop over them.
+    '''
+    starts, ends = indptr[positions], indptr[positions + 1]
+    lengths = ends - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return indices[np.repeat(starts, lengths) + offsets]
+
+
+class Adjacency(object):
+    '''
+    A link table as a sparse 0/1 matrix, rows are the first column's ids
+    (humans) and columns the second's (cats or cars).
+
+    row_ids and col_ids are the sorted ids, an id's index is where it
+    sits in them. indptr/indices is the CSR (the cats of each human),
+    t_indptr/t_indices the CSC (the humans of each cat).
+    '''
+    def __init__(self, row_column, col_column, sequence, rows, cols, seen):
+        self.row_column = row_column
+        self.col_column = col_column
+        self.sequence = sequence
+        self.last_seen = int(seen[-1]) if len(seen) else None
+        self.checksum = _checksum(seen, rows, cols)
+        self._build(rows, cols)
+
+    @classmethod
+    def from_links(cls, session, row_column, col_column, sequence=None, chunk_size=100000):
+        '''
+        Streams every link of the table row_column belongs to. sequence
+        is a column that grows with every insert and is what refresh()
+        reads from: the table's integer primary key by default, sqlite's
+        rowid for tables without one (hc_mapper).
+        '''
+        if sequence is None:
+            key = list(row_column.table.primary_key.columns)
+            if len(key) == 1 and isinstance(key[0].type, Integer):
+                sequence = key[0]
+            else:
+                sequence = literal_column('rowid')
+        rows, cols, seen = cls._read(session, row_column, col_column, sequence, None, chunk_size)
+        return cls(row_column, col_column, sequence, rows, cols, seen)
+
+    @staticmethod
+    def _read(session, row_column, col_column, sequence, after, chunk_size):
+        query = select(row_column, col_column, sequence).select_from(row_column.table).order_by(sequence)
+        if after is not None:
+            query = query.where(sequence > after)
+        # fromiter over the flattened rows, np.array() on a list of Row
+        # objects goes through every row as a sequence and is 10x slower
+        parts = [np.fromiter(chain.from_iterable(part), dtype=np.int64).reshape(-1, 3) for part in
+                 session.execute(query.execution_options(yield_per=chunk_size)).partitions()]
+        links = np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+        return links[:, 0], links[:, 1], links[:, 2]
+
+    def _build(self, rows, cols):
+        self.row_ids, row_index = np.unique(rows, return_inverse=True)
+        self.col_ids, col_index = np.unique(cols, return_inverse=True)
+        self.indptr, self.indices = _compress(row_index, col_index, len(self.row_ids))
+        self.t_indptr, self.t_indices = _compress(col_index, row_index, len(self.col_ids))
+
+    def _stored_checksum(self, session):
+        '''
+        The checksum the table has now for the rows up to last_seen.
+        '''
+        query = select(func.count(), *[func.coalesce(func.sum(_hash(self.sequence, self.row_column,
+                                                                     self.col_column, multiplier)), 0)
+                                       for multiplier in _MULTIPLIERS]) \
+            .select_from(self.row_column.table).where(self.sequence <= self.last_seen)
+        return tuple(session.execute(query).one())
+
+    def refresh(self, session, chunk_size=100000):
+        '''
+        Adds the links inserted since the last read and returns how many
+        links the graph gained (negative when it lost some).
+
+        The rows up to the last sequence value seen are checksummed in the
+        database first. When that isn't the checksum of what the graph
+        holds, links were deleted or replaced, sqlite hands a deleted row's
+        rowid (or id) to the next insert, and the whole table is read
+        again. Otherwise only the rows past it are read.
+        '''
+        before = self.links
+        if self.last_seen is not None and self._stored_checksum(session) != self.checksum:
+            rows, cols, seen = self._read(session, self.row_column, self.col_column, self.sequence,
+                                          None, chunk_size)
+            self.last_seen = int(seen[-1]) if len(seen) else None
+            self.checksum = _checksum(seen, rows, cols)
+            self._build(rows, cols)
+            return self.links - before
+        rows, cols, seen = self._read(session, self.row_column, self.col_column, self.sequence,
+                                      self.last_seen, chunk_size)
+        if len(rows):
+            old_rows = np.repeat(self.row_ids, np.diff(self.indptr))
+            old_cols = self.col_ids[self.indices]
+            self._build(np.concatenate([old_rows, rows]), np.concatenate([old_cols, cols]))
+            self.last_seen = int(seen[-1])
+            self.checksum = tuple(a + b for a, b in zip(self.checksum, _checksum(seen, rows, cols)))
+        return self.links - before
+
+    @property
+    def links(self):
+        return len(self.indices)
+
+    def row_index(self, ids):
+        '''
+        Indexes of row ids, -1 for ids without links.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.row_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        index = np.searchsorted(self.row_ids, ids).clip(max=len(self.row_ids) - 1)
+        return np.where(self.row_ids[index] == ids, index, -1)
+
+    def degree(self):
+        '''
+        (row ids, links per row), cats per human.
+        '''
+        return self.row_ids, np.diff(self.indptr)
+
+    def col_degree(self):
+        '''
+        (column ids, links per column), humans per cat.
+        '''
+        return self.col_ids, np.diff(self.t_indptr)
+
+    def top_k(self, k, columns=False):
+        '''
+        The k ids with the most links, most first, as (ids, degrees).
+        '''
+        ids, degrees = self.col_degree() if columns else self.degree()
+        k = min(k, len(ids))
+        top = np.argpartition(-degrees, k - 1)[:k] if k else np.array([], dtype=np.int64)
+        top = top[np.argsort(-degrees[top], kind='stable')]
+        return ids[top], degrees[top]
+
+    def shared(self, row_id):
+        '''
+        One row of A.A^T: links shared with every row, as a dense array
+        aligned with row_ids. The row itself is left at 0.
+        '''
+        index = int(self.row_index([row_id])[0])
+        if index < 0:
+            return np.zeros(len(self.row_ids), dtype=np.int64)
+        cols = self.indices[self.indptr[index]:self.indptr[index + 1]]
+        counts = np.bincount(_segments(self.t_indptr, self.t_indices, cols), minlength=len(self.row_ids))
+        counts[index] = 0
+        return counts
+
+    def co_owners(self, row_id, k=None):
+        '''
+        Rows sharing at least one column with row_id, most shared first, as
+        (ids, shared counts). "which humans share cats with this human".
+        '''
+        counts = self.shared(row_id)
+        others = np.flatnonzero(counts)
+        others = others[np.argsort(-counts[others], kind='stable')]
+        if k is not None:
+            others = others[:k]
+        return self.row_ids[others], counts[others]
+
+    def co_ownership(self, min_shared=1):
+        '''
+        All of A.A^T above the diagonal: (row id a, row id b, shared) for
+        every pair of rows sharing at least min_shared columns. Memory
+        grows with the sum of squared column degrees, mind popular cats.
+        '''
+        degrees = np.diff(self.t_indptr)
+        # every (row, row) pair inside each column
+        cols = np.repeat(np.arange(len(self.col_ids)), degrees)
+        left = np.repeat(self.t_indices, degrees[cols])
+        right = _segments(self.t_indptr, self.t_indices, cols)
+        keep = left < right
+        keys = left[keep].astype(np.int64) * len(self.row_ids) + right[keep]
+        keys, counts = np.unique(keys, return_counts=True)
+        keep = counts >= min_shared
+        keys, counts = keys[keep], counts[keep]
+        return self.row_ids[keys // len(self.row_ids)], self.row_ids[keys % len(self.row_ids)], counts
+
+
+def orm_degree(session):
+    Human = many_to_many.Human
+    return dict((human.id, len(human.cats)) for human in session.query(Human))
+
+
+def orm_co_owners(session, human_id):
+    Human = many_to_many.Human
+    shared = {}
+    for cat in session.get(Human, human_id).cats:
+        for human in cat.humans:
+            if human.id != human_id:
+                shared[human.id] = shared.get(human.id, 0) + 1
+    return sorted(shared.items(), key=lambda item: -item[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--humans', type=int, default=100000)
+    parser.add_argument('--cats', type=int, default=20000)
+    parser.add_argument('--links', type=int, default=5, help='cats per human')
+    parser.add_argument('--lookups', type=int, default=100, help='humans whose co-owners are looked up')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    many_to_many.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        many_to_many.seed(conn, args.humans, args.cats, args.links)
+    Session = sessionmaker(bind=engine)
+    hc_mapper = many_to_many.hc_mapper
+    lookups = range(1, args.humans + 1, max(args.humans // args.lookups, 1))
+    rows = []
+
+    def timed(name, approach, fn):
+        start = time.perf_counter()
+        result = fn()
+        rows.append(dict(question=name, approach=approach, seconds='%.3f' % (time.perf_counter() - start)))
+        return result
+
+    session = Session()
+    graph = timed('export', 'numpy', lambda: Adjacency.from_links(session, hc_mapper.c.human_id, hc_mapper.c.cat_id))
+    timed('cats per human', 'numpy', graph.degree)
+    orm_degrees = timed('cats per human', 'orm', lambda: orm_degree(session))
+    timed('top 10 cat owners', 'numpy', lambda: graph.top_k(10))
+    timed('top 10 cat owners', 'orm', lambda: sorted(orm_degrees.items(), key=lambda item: -item[1])[:10])
+    numpy_shared = timed('co-owners of %s humans' % len(lookups), 'numpy',
+                         lambda: [graph.co_owners(i) for i in lookups])
+    orm_shared = timed('co-owners of %s humans' % len(lookups), 'orm',
+                       lambda: [orm_co_owners(session, i) for i in lookups])
+    pairs = timed('all co-owner pairs (A.A^T)', 'numpy', lambda: graph.co_ownership())
+    session.close()
+
+    # the same answers both ways
+    ids, degrees = graph.degree()
+    assert dict(zip(ids.tolist(), degrees.tolist())) == orm_degrees
+    for (ids, counts), expected in zip(numpy_shared, orm_shared):
+        assert dict(zip(ids.tolist(), counts.tolist())) == dict(expected)
+
+    with engine.begin() as conn:
+        conn.execute(hc_mapper.insert(), [dict(human_id=args.humans + 1, cat_id=c) for c in range(1, 11)])
+    session = Session()
+    added = timed('refresh with 10 new links', 'numpy', lambda: graph.refresh(session))
+    session.close()
+
+    # the last link deleted and one inserted, which gets its rowid: the
+    # count stays the same, the checksum doesn't
+    with engine.begin() as conn:
+        conn.execute(hc_mapper.delete().where(hc_mapper.c.human_id == args.humans + 1, hc_mapper.c.cat_id == 10))
+        conn.execute(hc_mapper.insert(), [dict(human_id=args.humans + 1, cat_id=11)])
+    session = Session()
+    timed('refresh after a delete and an insert', 'numpy', lambda: graph.refresh(session))
+    links = set(zip(np.repeat(graph.row_ids, np.diff(graph.indptr)).tolist(), graph.col_ids[graph.indices].tolist()))
+    assert links == set(map(tuple, session.execute(select(hc_mapper.c.human_id, hc_mapper.c.cat_id))))
+    session.close()
+
+    # human_car_association has an id to refresh from
+    cars_engine = create_engine('sqlite://')
+    association_object.Base.metadata.create_all(bind=cars_engine)
+    with cars_engine.begin() as conn:
+        association_object.seed(conn, args.humans, args.cats, args.links)
+    session = sessionmaker(bind=cars_engine)()
+    table = association_object.HumanCarAssociation.__table__
+    cars = timed('export human_car_association', 'numpy',
+                 lambda: Adjacency.from_links(session, table.c.human_id, table.c.car_id))
+    timed('top 10 most driven cars', 'numpy', lambda: cars.top_k(10, columns=True))
+    session.close()
+
+    print_table(rows, ['question', 'approach', 'seconds'])
+    print('%s links, %s humans, %s cats, %s co-owner pairs, %s links added by the refresh'
+          % (graph.links, len(graph.row_ids), len(graph.col_ids), len(pairs[0]), added))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+Benchmark harness that runs every relationship workload at scalable sizes
+against the engine configurations in engines.py and writes JSON results.
+
+    python performance/harness.py --sizes 1000 10000 --repeat 5 --warmup 1 --output results.json
+'''
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from engines import CONFIGS, make_engine, remove_database
+from workloads import WORKLOADS
+
+
+def run_once(workload, config, size, path):
+    '''
+    Times one run of a workload on a fresh database.
+    '''
+    metadata, fn = WORKLOADS[workload]
+    engine = make_engine(config, path)
+    try:
+        metadata.create_all(bind=engine)
+        start = time.perf_counter()
+        fn(sessionmaker(bind=engine), size)
+        return time.perf_counter() - start
+    finally:
+        engine.dispose()
+        remove_database(path)
+
+
+def run(workloads, configs, sizes, repeat=3, warmup=1, path=None):
+    '''
+    Runs every combination and returns one result dict per combination,
+    warmup runs are done but not recorded.
+    '''
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), 'relationship_benchmark.db')
+    results = []
+    for workload in workloads:
+        for config in configs:
+            for size in sizes:
+                for _ in range(warmup):
+                    run_once(workload, config, size, path)
+                times = [run_once(workload, config, size, path) for _ in range(repeat)]
+                median = statistics.median(times)
+                results.append(dict(
+                    workload=workload, config=config, size=size, repeat=repeat, warmup=warmup,
+                    times=times, min=min(times), median=median, mean=statistics.mean(times),
+                    parents_per_sec=size / median,
+                ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workloads', nargs='+', default=sorted(WORKLOADS), choices=sorted(WORKLOADS))
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS), choices=CONFIGS)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--path', help='database file for the file and wal configs')
+    parser.add_argument('--output', help='write the JSON results here, - for stdout')
+    args = parser.parse_args()
+
+    results = run(args.workloads, args.configs, args.sizes, args.repeat, args.warmup, args.path)
+    document = dict(
+        created=datetime.now(timezone.utc).isoformat(),
+        python=platform.python_version(),
+        sqlalchemy=sqlalchemy.__version__,
+        sqlite=sqlite3.sqlite_version,
+        results=results,
+    )
+    if args.output == '-':
+        json.dump(document, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(results, ['workload', 'config', 'size', 'min', 'median', 'parents_per_sec'])
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(document, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
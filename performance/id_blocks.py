@@ -0,0 +1,241 @@
+'''
+Block (hi/lo) primary key allocation for the Sequence keyed models.
+
+Instead of one sequence round trip per row, an allocator reserves a block
+of ids at a time and hands them out client side, so parents and children
+can be given their keys before anything is flushed and written with a
+few executemany statements.
+
+    TableBlockAllocator     a row per key in the id_blocks table, works anywhere (sqlite)
+    SequenceBlockAllocator  a sequence of its own created with INCREMENT BY block_size
+
+    python performance/id_blocks.py --parents 10000 --children-per-parent 10 --block-size 1000
+    python performance/id_blocks.py --url postgresql://localhost/hitchhikers
+'''
+import abc
+import argparse
+import threading
+import time
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Sequence, create_engine, event, func, select, update
+from sqlalchemy.orm import sessionmaker
+
+from bench import StatementCounter, print_table
+from models.one_to_many import Base, Person, Offence
+
+metadata = MetaData()
+
+# one row per allocator, next_id is the first id of the next free block
+id_blocks = Table(
+    'id_blocks',
+    metadata,
+    Column('name', String(50), primary_key=True),
+    Column('next_id', Integer, nullable=False)
+)
+
+
+def _start_above(engine, start, above):
+    '''
+    start, or past the highest value of the column above when that is
+    higher.
+    '''
+    if above is None:
+        return start
+    with engine.connect() as conn:
+        top = conn.execute(select(func.max(above))).scalar()
+    return max(start, (top or 0) + 1)
+
+
+class BlockAllocator(abc.ABC):
+    '''
+    Hands out ids from reserved blocks, thread safe. Subclasses implement
+    _reserve() which returns the first id of a fresh block of block_size.
+
+    A block is reserved in a transaction of its own. On a sqlite file that
+    waits for the write lock, so a session that has already written
+    (flushed) in its transaction would wait on itself until "database is
+    locked": take the ids before the first write, or pass the session's
+    connection, next_id(session.connection()), to reserve in its
+    transaction. A block reserved that way is dropped when that
+    transaction rolls back, use its ids in the same transaction.
+    '''
+    def __init__(self, engine, name, block_size=1000):
+        self.engine = engine
+        self.name = name
+        self.block_size = block_size
+        self.reservations = 0
+        self._next = self._limit = 0
+        self._lock = threading.Lock()
+
+    def next_id(self, connection=None):
+        with self._lock:
+            if self._next >= self._limit:
+                if connection is None:
+                    with self.engine.begin() as conn:
+                        self._next = self._reserve(conn)
+                else:
+                    self._next = self._reserve(connection)
+                    event.listen(connection, 'rollback', self._drop_block, once=True)
+                self._limit = self._next + self.block_size
+                self.reservations += 1
+            value = self._next
+            self._next += 1
+            return value
+
+    def next_ids(self, count, connection=None):
+        return [self.next_id(connection) for _ in range(count)]
+
+    def _drop_block(self, connection):
+        with self._lock:
+            self._next = self._limit = 0
+
+    @abc.abstractmethod
+    def _reserve(self, connection):
+        '''
+        Reserves a block through connection and returns its first id.
+        '''
+
+
+class TableBlockAllocator(BlockAllocator):
+    '''
+    Emulates a sequence with a row in id_blocks, the UPDATE takes sqlite's
+    write lock so two processes never get the same block. The ids start at
+    start, or past the highest value of the column above (Person.id), and
+    an existing row is moved up there too.
+    '''
+    def __init__(self, engine, name, block_size=1000, start=1, above=None):
+        super(TableBlockAllocator, self).__init__(engine, name, block_size)
+        start = _start_above(engine, start, above)
+        metadata.create_all(bind=engine, tables=[id_blocks])
+        with engine.begin() as conn:
+            exists = conn.execute(select(id_blocks.c.next_id).where(id_blocks.c.name == name)).first()
+            if exists is None:
+                conn.execute(id_blocks.insert(), [dict(name=name, next_id=start)])
+            else:
+                conn.execute(update(id_blocks).where(id_blocks.c.name == name, id_blocks.c.next_id < start)
+                             .values(next_id=start))
+
+    def _reserve(self, connection):
+        connection.execute(update(id_blocks).where(id_blocks.c.name == self.name)
+                           .values(next_id=id_blocks.c.next_id + self.block_size))
+        return connection.execute(select(id_blocks.c.next_id).where(id_blocks.c.name == self.name)) \
+            .scalar() - self.block_size
+
+
+class SequenceBlockAllocator(BlockAllocator):
+    '''
+    Uses a real sequence of its own, <name>_block_seq, created (if it isn't
+    there yet) with INCREMENT BY block_size so every value is the start of
+    a whole block. Never point it at a model's own sequence: those step by
+    1 and the blocks would overlap. An existing <name>_block_seq has to
+    have been created with the same block_size, start (or the column
+    above) only counts when the sequence is created.
+    '''
+    def __init__(self, engine, name, block_size=1000, start=1, above=None):
+        super(SequenceBlockAllocator, self).__init__(engine, name, block_size)
+        self.sequence = Sequence('%s_block_seq' % name, start=_start_above(engine, start, above),
+                                 increment=block_size)
+        self.sequence.create(bind=engine, checkfirst=True)
+
+    def _reserve(self, connection):
+        return connection.execute(self.sequence.next_value()).scalar()
+
+
+def allocator_for(engine, name, block_size=1000, start=1, above=None):
+    '''
+    A sequence backed allocator where the dialect has sequences, the
+    table emulation everywhere else.
+
+    The models keep their own sequences (person_seq) and know nothing of
+    the blocks: rows the database numbers and rows numbered from here
+    collide in the same table. Give above=Person.id to start past what is
+    there, and let one or the other number a table from then on.
+    '''
+    if engine.dialect.supports_sequences:
+        return SequenceBlockAllocator(engine, name, block_size, start, above)
+    return TableBlockAllocator(engine, name, block_size, start, above)
+
+
+def ingest_orm(session, parents, children):
+    '''
+    Plain ORM, the database hands out every key.
+    '''
+    for i in range(parents):
+        person = Person(name='person %s' % i)
+        person.offences = [Offence(description='offence %s.%s' % (i, j)) for j in range(children)]
+        session.add(person)
+    session.commit()
+
+
+def ingest_orm_blocks(session, parents, children, persons, offences):
+    '''
+    ORM objects with keys from the allocators, the flush needs nothing back
+    from the database and batches every INSERT.
+    '''
+    for i in range(parents):
+        person = Person(id=persons.next_id(), name='person %s' % i)
+        person.offences = [Offence(id=offences.next_id(), description='offence %s.%s' % (i, j))
+                           for j in range(children)]
+        session.add(person)
+    session.commit()
+
+
+def ingest_core_blocks(connection, parents, children, persons, offences):
+    '''
+    Keys from the allocators and two executemany statements, no ORM at all.
+    '''
+    person_rows, offence_rows = [], []
+    for i in range(parents):
+        person_id = persons.next_id()
+        person_rows.append(dict(id=person_id, name='person %s' % i))
+        for j in range(children):
+            offence_rows.append(dict(id=offences.next_id(), person_id=person_id,
+                                     description='offence %s.%s' % (i, j)))
+    connection.execute(Person.__table__.insert(), person_rows)
+    connection.execute(Offence.__table__.insert(), offence_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--parents', type=int, default=10000)
+    parser.add_argument('--children-per-parent', type=int, default=10)
+    parser.add_argument('--block-size', type=int, default=1000)
+    parser.add_argument('--url', default='sqlite://',
+                        help='a scratch database (its persons and offences tables are dropped), '
+                             'one with sequences uses SequenceBlockAllocator')
+    args = parser.parse_args()
+
+    rows = []
+    for mode in ('orm', 'orm_blocks', 'core_blocks'):
+        engine = create_engine(args.url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        persons = allocator_for(engine, 'persons', args.block_size, above=Person.id)
+        offences = allocator_for(engine, 'offences', args.block_size, above=Offence.id)
+        with StatementCounter(engine) as counter:
+            start = time.perf_counter()
+            if mode == 'orm':
+                ingest_orm(sessionmaker(bind=engine)(), args.parents, args.children_per_parent)
+            elif mode == 'orm_blocks':
+                ingest_orm_blocks(sessionmaker(bind=engine)(), args.parents, args.children_per_parent,
+                                  persons, offences)
+            else:
+                with engine.begin() as conn:
+                    ingest_core_blocks(conn, args.parents, args.children_per_parent, persons, offences)
+            seconds = time.perf_counter() - start
+        with engine.connect() as conn:
+            count = conn.execute(select(func.count()).select_from(Offence)).scalar()
+            distinct = conn.execute(select(func.count(func.distinct(Offence.id)))).scalar()
+        assert count == distinct == args.parents * args.children_per_parent, (mode, count, distinct)
+        total = args.parents * (1 + args.children_per_parent)
+        rows.append(dict(mode=mode, seconds=seconds, rows_per_sec=int(total / seconds),
+                         statements=counter.count, reservations=persons.reservations + offences.reservations))
+        engine.dispose()
+
+    print('%s parents, %s children each, blocks of %s from %s' % (
+        args.parents, args.children_per_parent, args.block_size, type(persons).__name__))
+    print_table(rows, ['mode', 'seconds', 'rows_per_sec', 'statements', 'reservations'])
+
+
+if __name__ == '__main__':
+    main()
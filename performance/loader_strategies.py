@@ -0,0 +1,102 @@
+'''
+Runs the many to many workloads from d_1 - d_4 under every relationship
+loading strategy and reports query count, wall time and peak memory.
+
+    python performance/loader_strategies.py --humans 10000 --links-per-human 10
+'''
+import argparse
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import sessionmaker, joinedload, selectinload, subqueryload, lazyload, raiseload
+
+from bench import measure, print_table
+from models.many_to_many import Base, Human, Cat, seed
+
+STRATEGIES = {
+    'joined': joinedload,
+    'selectin': selectinload,
+    'subquery': subqueryload,
+    'lazy': lazyload,
+    'raise': raiseload,
+}
+
+
+def get_cats(Session, strategy, human_ids):
+    '''
+    The get_cats() lookup from the examples, one query per human.
+    '''
+    session = Session()
+    for human_id in human_ids:
+        human_obj = session.query(Human).options(strategy(Human.cats)) \
+            .filter(Human.id == human_id).first()
+        for cat in human_obj.cats:
+            cat.name
+    session.close()
+
+
+def full_scan(Session, strategy):
+    '''
+    Loads every human and touches every cat.
+    '''
+    session = Session()
+    for human_obj in session.query(Human).options(strategy(Human.cats)):
+        for cat in human_obj.cats:
+            cat.name
+    session.close()
+
+
+def backref_walk(Session, strategy):
+    '''
+    Loads every cat and walks Cat.humans, Human.cats is switched to lazy
+    so the humans found don't drag their own cats along.
+    '''
+    session = Session()
+    for cat_obj in session.query(Cat).options(strategy(Cat.humans).lazyload(Human.cats)):
+        for human in cat_obj.humans:
+            human.name
+    session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--humans', type=int, default=10000)
+    parser.add_argument('--cats', type=int, default=10000)
+    parser.add_argument('--links-per-human', type=int, default=10)
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        seed(conn, args.humans, args.cats, args.links_per_human)
+    Session = sessionmaker(bind=engine)
+
+    human_ids = random.Random(7).sample(range(1, args.humans + 1), min(args.lookups, args.humans))
+    workloads = [
+        ('get_cats', lambda s: get_cats(Session, s, human_ids)),
+        ('full_scan', lambda s: full_scan(Session, s)),
+        ('backref_walk', lambda s: backref_walk(Session, s)),
+    ]
+
+    rows = []
+    for workload, fn in workloads:
+        for name in args.strategies:
+            strategy = STRATEGIES[name]
+            row = dict(workload=workload, strategy=name)
+            try:
+                row.update(measure(engine, lambda: fn(strategy), memory=not args.no_memory))
+            except InvalidRequestError:
+                # raiseload refuses the collection access, which is the point
+                row['queries'] = 'raised'
+            rows.append(row)
+
+    print('%s humans, %s cats, %s links' % (args.humans, args.cats, args.humans * args.links_per_human))
+    print_table(rows, ['workload', 'strategy', 'queries', 'seconds', 'peak_kb'])
+
+
+if __name__ == '__main__':
+    main()
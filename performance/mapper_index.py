@@ -0,0 +1,106 @@
+'''
+Benchmarks Cat.humans backref loads and unlinks on hc_mapper as the table
+grows, with the composite primary key and reverse index against the bare
+two column table the examples used to have.
+
+    python performance/mapper_index.py --sizes 1000 10000 100000 1000000 10000000
+'''
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine, func, select, Table, MetaData, Column, Integer
+from sqlalchemy.orm import sessionmaker, defaultload, selectinload
+
+from bench import print_table
+from models.many_to_many import Base, Human, Cat, hc_mapper, seed
+
+LINKS_PER_HUMAN = 10
+
+# the hc_mapper the examples used to ship, two columns and nothing else
+bare_hc_mapper = Table(
+    'hc_mapper',
+    MetaData(),
+    Column('human_id', Integer),
+    Column('cat_id', Integer)
+)
+
+
+def _humans(links):
+    '''
+    LINKS_PER_HUMAN links each, the last human gets what is left over.
+    '''
+    return max(-(-links // LINKS_PER_HUMAN), 1)
+
+
+def build(links, keyed):
+    '''
+    A fresh database holding `links` link rows, keyed or bare.
+    '''
+    humans = _humans(links)
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        if keyed:
+            Base.metadata.create_all(bind=conn)
+            table = hc_mapper
+        else:
+            Base.metadata.create_all(bind=conn, tables=[Human.__table__, Cat.__table__])
+            bare_hc_mapper.create(conn)
+            table = bare_hc_mapper
+        seed(conn, humans, max(humans, LINKS_PER_HUMAN), LINKS_PER_HUMAN, table=table, total_links=links)
+        assert conn.execute(select(func.count()).select_from(table)).scalar() == links
+    return engine
+
+
+def per_op_ms(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) * 1000 / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000, 10000000])
+    parser.add_argument('--ops', type=int, default=20, help='backref loads and unlinks per size')
+    args = parser.parse_args()
+
+    rows = []
+    for links in args.sizes:
+        for keyed in (True, False):
+            engine = build(links, keyed)
+            Session = sessionmaker(bind=engine)
+            rand = random.Random(7)
+            humans = _humans(links)
+            with engine.connect() as conn:
+                pairs = conn.execute(select(hc_mapper.c.human_id, hc_mapper.c.cat_id)
+                                     .where(hc_mapper.c.human_id.in_(rand.sample(range(1, humans + 1), min(args.ops, humans))))
+                                     .group_by(hc_mapper.c.human_id)).all()
+
+            # Human.cats is lazy=False, sqlite materializes that nested
+            # LEFT OUTER JOIN by scanning all of hc_mapper whatever the
+            # indexes, so it is swapped out to measure the table itself
+            def backref_load(cat_id):
+                session = Session()
+                list(session.get(Cat, cat_id, options=[defaultload(Cat.humans).lazyload(Human.cats)]).humans)
+                session.close()
+
+            def unlink(pair):
+                session = Session()
+                human_obj = session.get(Human, pair[0], options=[selectinload(Human.cats)])
+                human_obj.cats.remove(session.get(Cat, pair[1]))
+                session.commit()
+                session.close()
+
+            rows.append(dict(
+                links=links, table='keyed' if keyed else 'bare',
+                backref_ms=per_op_ms(backref_load, [cat_id for _, cat_id in pairs]),
+                unlink_ms=per_op_ms(unlink, pairs),
+            ))
+            engine.dispose()
+
+    print_table(rows, ['links', 'table', 'backref_ms', 'unlink_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+'''
+The relationship catalogue models, one module per example so every
+benchmark can import them without running the demo scripts.
+'''
+from itertools import islice
+
+
+def insert_batched(connection, table, rows, batch_size=100000):
+    '''
+    Executemany inserts of rows, an iterable of dicts, batch_size at a
+    time so a generator of millions of rows never sits in memory at once.
+    '''
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        connection.execute(table.insert(), batch)
@@ -0,0 +1,83 @@
+'''
+Human, Car and the HumanCarAssociation object from the association
+object example (e_1).
+'''
+from itertools import islice
+
+from sqlalchemy import Column, Integer, ForeignKey, String, func, DateTime, Index
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import relationship, declarative_base
+
+from models import insert_batched
+
+# base class for all of the models
+Base = declarative_base()
+
+class HumanCarAssociation(Base):
+    '''
+    HumanCarAssociation accesses the Car as Many to One
+    '''
+    __tablename__ = 'human_car_association'
+    # a human can only be linked to a car once, the unique index covers
+    # lookups by human_id and the reverse index covers lookups by car_id
+    __table_args__ = (
+        Index('ix_human_car_association_human_car', 'human_id', 'car_id', unique=True),
+        Index('ix_human_car_association_car_human', 'car_id', 'human_id'),
+    )
+    # datetime comes back with RETURNING in the INSERT, see Humanoid
+    __mapper_args__ = {'eager_defaults': True}
+    id = Column(Integer, primary_key=True)
+    datetime = Column(DateTime, default=func.now())
+
+    human_id = Column(Integer, ForeignKey('humans.id'))
+    car_id = Column(Integer, ForeignKey('cars.id'))
+
+    cars = relationship('Car', back_populates='driversAssoc')
+    human = relationship('Human', back_populates='carsAssoc')
+
+class Human(Base):
+    '''
+    Human accesses the Association as a One to Many relationship
+    '''
+    __tablename__ = 'humans'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    carsAssoc = relationship('HumanCarAssociation', back_populates='human')
+    cars = association_proxy('carsAssoc', 'cars', creator=lambda car: HumanCarAssociation(cars=car))
+
+class Car(Base):
+    '''
+    car accesses the Association as a One to Many relationship
+    so it can tell who drives it
+    '''
+    __tablename__ = 'cars'
+    id = Column(Integer, primary_key=True)
+    model = Column(String)
+    driversAssoc = relationship('HumanCarAssociation', back_populates='cars')
+    drivers = association_proxy('driversAssoc', 'human', creator=lambda human: HumanCarAssociation(human=human))
+
+
+def drivers_of_car(session, car_id):
+    '''
+    Every human that drives the car in one query, served by the reverse index.
+    '''
+    return session.query(Human).join(Human.carsAssoc).filter(HumanCarAssociation.car_id == car_id).all()
+
+
+def seed(connection, humans, cars, links_per_human, random_seed=42, batch_size=100000, total_links=None):
+    '''
+    Fills the tables with core executemany inserts, each human drives
+    links_per_human distinct random cars. Rows are written in batches of
+    batch_size so tens of millions of links never sit in memory at once.
+    total_links stops the links there, the last humans drive fewer (or none).
+    '''
+    import random
+    rand = random.Random(random_seed)
+    insert_batched(connection, Human.__table__,
+                   (dict(id=i, name='human %s' % i) for i in range(1, humans + 1)), batch_size)
+    insert_batched(connection, Car.__table__,
+                   (dict(id=i, model='car %s' % i) for i in range(1, cars + 1)), batch_size)
+    insert_batched(connection, HumanCarAssociation.__table__,
+                   islice((dict(human_id=human_id, car_id=car_id) for human_id in range(1, humans + 1)
+                           for car_id in rand.sample(range(1, cars + 1), min(links_per_human, cars))),
+                          total_links), batch_size)
@@ -0,0 +1,58 @@
+'''
+Human and Cat from the many to many examples (d_1 - d_4), linked through
+the hc_mapper secondary table.
+'''
+from itertools import islice
+
+from sqlalchemy import Table, Column, Integer, ForeignKey, Sequence, String, Index
+from sqlalchemy.orm import relationship, declarative_base
+
+from models import insert_batched
+
+# base class for all of the models
+Base = declarative_base()
+
+hc_mapper = Table(
+    'hc_mapper',
+    Base.metadata,
+    # the composite primary key stops duplicate links and covers lookups
+    # by human_id, the reverse index covers lookups by cat_id (Cat.humans)
+    Column('human_id', ForeignKey('humans.id'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+)
+
+class Human(Base):
+    __tablename__ = "humans"
+    id = Column(Integer, Sequence('human_seq'), primary_key=True)
+    name = Column(String)
+    # lazy=False just like the examples, the benchmarks override it
+    # per query with loader options
+    cats = relationship('Cat', secondary=hc_mapper, back_populates='humans', lazy=False)
+
+class Cat(Base):
+    __tablename__ = "cats"
+    id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+    name = Column(String)
+    humans = relationship('Human', secondary=hc_mapper, back_populates='cats')
+
+
+def seed(connection, humans, cats, links_per_human, random_seed=42, table=hc_mapper, batch_size=100000,
+         total_links=None):
+    '''
+    Fills the tables with core executemany inserts, each human gets
+    links_per_human distinct random cats. Rows are written in batches of
+    batch_size, links to table, so tens of millions of them never sit in
+    memory at once. total_links stops the links there, the last humans
+    get fewer (or none).
+    '''
+    import random
+    rand = random.Random(random_seed)
+    insert_batched(connection, Human.__table__,
+                   (dict(id=i, name='human %s' % i) for i in range(1, humans + 1)), batch_size)
+    insert_batched(connection, Cat.__table__,
+                   (dict(id=i, name='cat %s' % i) for i in range(1, cats + 1)), batch_size)
+    insert_batched(connection, table,
+                   islice((dict(human_id=human_id, cat_id=cat_id) for human_id in range(1, humans + 1)
+                           for cat_id in rand.sample(range(1, cats + 1), min(links_per_human, cats))),
+                          total_links), batch_size)
@@ -0,0 +1,35 @@
+'''
+Human and Cat from the many to many delete all example (d_6) with the
+link rows left to the database: the hc_mapper foreign keys cascade on
+delete and both sides of the relationship use passive_deletes, so
+deleting a human never loads its cats.
+
+sqlite only enforces foreign keys when asked to on every connection,
+create the engine with engines.make_engine(foreign_keys=True) or call
+engines.enable_foreign_keys(engine) or the link rows are left dangling.
+'''
+from sqlalchemy import Table, Column, Integer, ForeignKey, Sequence, String, Index
+from sqlalchemy.orm import relationship, declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+hc_mapper = Table(
+    'hc_mapper',
+    Base.metadata,
+    Column('human_id', ForeignKey('humans.id', ondelete='CASCADE'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+)
+
+class Human(Base):
+    __tablename__ = "humans"
+    id = Column(Integer, Sequence('human_seq'), primary_key=True)
+    name = Column(String)
+    cats = relationship('Cat', secondary=hc_mapper, back_populates='humans', passive_deletes=True)
+
+class Cat(Base):
+    __tablename__ = "cats"
+    id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+    name = Column(String)
+    humans = relationship('Human', secondary=hc_mapper, back_populates='cats', passive_deletes=True)
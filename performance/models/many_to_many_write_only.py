@@ -0,0 +1,49 @@
+'''
+Human and Cat from the many to many examples with Human.cats as a write
+only collection, append/remove never load it and reads are explicit
+queries through human.cats.select().
+'''
+from sqlalchemy import Table, Column, Integer, ForeignKey, Sequence, String, Index, func, select
+from sqlalchemy.orm import relationship, declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+hc_mapper = Table(
+    'hc_mapper',
+    Base.metadata,
+    Column('human_id', ForeignKey('humans.id'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+)
+
+class Human(Base):
+    __tablename__ = "humans"
+    id = Column(Integer, Sequence('human_seq'), primary_key=True)
+    name = Column(String)
+    cats = relationship('Cat', secondary=hc_mapper, lazy='write_only')
+
+class Cat(Base):
+    '''
+    No humans backref, a write only collection can't keep the other side
+    in sync without loading it, query hc_mapper instead.
+    '''
+    __tablename__ = "cats"
+    id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+    name = Column(String)
+
+
+def page_cats(session, human_obj, page, per_page=50):
+    '''
+    One page of a human's cats ordered by id, pages start at 0.
+    '''
+    return session.scalars(human_obj.cats.select().order_by(Cat.id)
+                           .limit(per_page).offset(page * per_page)).all()
+
+
+def count_cats(session, human_obj):
+    '''
+    Counts a human's cats in the database.
+    '''
+    return session.scalar(select(func.count()).select_from(hc_mapper)
+                          .where(hc_mapper.c.human_id == human_obj.id))
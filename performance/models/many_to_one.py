@@ -0,0 +1,20 @@
+'''
+User and Website from the many to one example (b_1).
+'''
+from sqlalchemy import Column, Integer, ForeignKey, String
+from sqlalchemy.orm import relationship, declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    website_id = Column(Integer, ForeignKey('website.id'))
+    website = relationship('Website')
+
+class Website(Base):
+    __tablename__ = 'website'
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
@@ -0,0 +1,26 @@
+'''
+Person and Offence from the one to many example (a_1).
+'''
+from sqlalchemy import Column, Integer, ForeignKey, Sequence, String
+from sqlalchemy.orm import relationship, declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+class Person(Base):
+    '''
+    A simple person model with name and offences columns the id is the primary key.
+    '''
+    __tablename__ = 'persons'
+    id = Column(Integer, Sequence('person_seq'), primary_key=True)
+    name = Column(String(50), nullable=False)
+    offences = relationship('Offence')
+
+class Offence(Base):
+    '''
+    Offence that are logged against a person.
+    '''
+    __tablename__ = 'offences'
+    id = Column(Integer, Sequence('offences_seq'), primary_key=True)
+    description = Column(String(50), unique=True)
+    person_id = Column(Integer, ForeignKey('persons.id'))
@@ -0,0 +1,32 @@
+'''
+Humanoid and BarCode from the one to one example (c_1).
+
+The wide columns are deferred in groups so a plain query only fetches
+what identifies a bot, undefer_group('details') / undefer_group('crypto')
+(or load_only) bring the rest back when a report needs it.
+'''
+from sqlalchemy import Column, Integer, ForeignKey, Sequence, String, func, DateTime
+from sqlalchemy.orm import relationship, declarative_base, deferred
+
+# base class for all of the models
+Base = declarative_base()
+
+class Humanoid(Base):
+    __tablename__ = 'humanoids'
+    # fetch date_initiated back with RETURNING in the INSERT even when
+    # the id is assigned up front, no SELECT the first time it is read
+    __mapper_args__ = {'eager_defaults': True}
+    id = Column(Integer, Sequence('humanoid_seq'), primary_key=True)
+    name = Column(String, nullable=False)
+    # complaint can be a novel, leave it and the date behind unless asked
+    date_initiated = deferred(Column(DateTime, default=func.now()), group='details')
+    complaint = deferred(Column(String, nullable=False), group='details')
+    barcode = relationship('BarCode', uselist=False, back_populates="humanoid", lazy=False)
+
+class BarCode(Base):
+    __tablename__ = 'overlord_barcodes'
+    id = Column(Integer, Sequence('overload_bc_seq'), primary_key=True)
+    actual = Column(String, nullable=False, unique=True)
+    encryption_type = deferred(Column(String), group='crypto')
+    humanoid_id = Column(ForeignKey('humanoids.id'), nullable=False)
+    humanoid = relationship('Humanoid', uselist=False, back_populates="barcode")
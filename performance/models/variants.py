@@ -0,0 +1,72 @@
+'''
+Person/Offence (a_1 - a_3) and Human/Cat (d_1 - d_3) declared the three
+ways the catalogue shows: plain, back_populates and backref. Every call to
+build() makes a fresh declarative base, so the variants can sit side by
+side in one process.
+
+    models = build('backref')
+    models.Person, models.Offence, models.Human, models.Cat, models.hc_mapper
+'''
+from types import SimpleNamespace
+
+from sqlalchemy import Table, Column, Integer, ForeignKey, Sequence, String, Index
+from sqlalchemy.orm import relationship, declarative_base
+
+VARIANTS = ('plain', 'back_populates', 'backref')
+
+
+def _relationship(variant, target, reverse, **kwargs):
+    '''
+    The parent side relationship, with reverse as its backref or
+    back_populates name depending on variant.
+    '''
+    if variant != 'plain':
+        kwargs[variant] = reverse
+    return relationship(target, **kwargs)
+
+
+def build(variant):
+    if variant not in VARIANTS:
+        raise ValueError('unknown variant %r, pick one of %s' % (variant, ', '.join(VARIANTS)))
+
+    # base class for all of the models
+    Base = declarative_base()
+
+    class Person(Base):
+        __tablename__ = 'persons'
+        id = Column(Integer, Sequence('person_seq'), primary_key=True)
+        name = Column(String(50), nullable=False)
+        offences = _relationship(variant, 'Offence', 'person')
+
+    class Offence(Base):
+        __tablename__ = 'offences'
+        id = Column(Integer, Sequence('offences_seq'), primary_key=True)
+        description = Column(String(50), unique=True)
+        person_id = Column(Integer, ForeignKey('persons.id'))
+        if variant == 'back_populates':
+            person = relationship('Person', back_populates='offences')
+
+    hc_mapper = Table(
+        'hc_mapper',
+        Base.metadata,
+        Column('human_id', ForeignKey('humans.id'), primary_key=True),
+        Column('cat_id', ForeignKey('cats.id'), primary_key=True),
+        Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+    )
+
+    class Human(Base):
+        __tablename__ = 'humans'
+        id = Column(Integer, Sequence('human_seq'), primary_key=True)
+        name = Column(String)
+        # lazy=False like d_1 - d_3
+        cats = _relationship(variant, 'Cat', 'humans', secondary=hc_mapper, lazy=False)
+
+    class Cat(Base):
+        __tablename__ = 'cats'
+        id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+        name = Column(String)
+        if variant == 'back_populates':
+            humans = relationship('Human', secondary=hc_mapper, back_populates='cats')
+
+    return SimpleNamespace(variant=variant, Base=Base, Person=Person, Offence=Offence,
+                           Human=Human, Cat=Cat, hc_mapper=hc_mapper)
@@ -0,0 +1,190 @@
+'''
+N+1 lazy load detector built on SQLAlchemy events.
+
+Counts the statements of each logical operation and records every lazy
+load with the relationship it came from and the line of code that
+touched the attribute. When the same relationship lazy loads for
+`threshold` or more different parents inside one operation it is
+reported as an N+1, optionally as a test failure.
+
+    detector = NPlusOneDetector(raise_on_detect=True)
+    with detector:
+        with detector.operation('offences report'):
+            for offence in person.offences:
+                ...
+
+    python performance/nplusone.py
+'''
+import os
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+_SKIP_DIRS = (os.path.dirname(sqlalchemy.__file__), os.path.dirname(contextmanager.__code__.co_filename))
+
+
+class NPlusOneError(AssertionError):
+    '''
+    Raised when raise_on_detect is set and an N+1 was found, it is an
+    AssertionError so test runners report it as a failure.
+    '''
+
+
+class Finding(object):
+    '''
+    One relationship that lazy loaded for several parents from the same
+    call site during an operation.
+    '''
+    def __init__(self, operation, relationship, call_site, statement):
+        self.operation = operation
+        self.relationship = relationship
+        self.call_site = call_site
+        self.statement = statement
+        self.loads = 0
+        self.parents = set()
+
+    def __str__(self):
+        return '%s lazy loaded %s times for %s parents at %s (operation: %s)' % (
+            self.relationship, self.loads, len(self.parents), self.call_site, self.operation)
+
+
+def call_site():
+    '''
+    The first frame outside of sqlalchemy above the event handler, as
+    file:line in function.
+    '''
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_SKIP_DIRS + ('<sqlalchemy generated',)):
+            return '%s:%s in %s' % (filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class NPlusOneDetector(object):
+    '''
+    Listens on every Session and Engine by default, pass a sessionmaker,
+    session or engine to narrow it down.
+    '''
+    def __init__(self, session_target=Session, engine_target=Engine, threshold=2, raise_on_detect=False):
+        self.session_target = session_target
+        self.engine_target = engine_target
+        self.threshold = threshold
+        self.raise_on_detect = raise_on_detect
+        self.statements = defaultdict(int)
+        self._lazy_loads = {}
+        self._operation = None
+
+    def _do_orm_execute(self, orm_execute_state):
+        parent = orm_execute_state.lazy_loaded_from
+        if parent is None:
+            # a query or an eager load, not a lazy load
+            return
+        relationship = str(orm_execute_state.loader_strategy_path.prop)
+        site = call_site()
+        key = (self._operation, relationship, site)
+        finding = self._lazy_loads.get(key)
+        if finding is None:
+            finding = self._lazy_loads[key] = Finding(
+                self._operation, relationship, site, str(orm_execute_state.statement))
+        finding.loads += 1
+        finding.parents.add(parent.identity_key or id(parent))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements[self._operation] += 1
+
+    def __enter__(self):
+        event.listen(self.session_target, 'do_orm_execute', self._do_orm_execute)
+        event.listen(self.engine_target, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.session_target, 'do_orm_execute', self._do_orm_execute)
+        event.remove(self.engine_target, 'before_cursor_execute', self._before_cursor_execute)
+        if exc_type is None:
+            self._check(self.findings)
+
+    @contextmanager
+    def operation(self, name):
+        '''
+        Attributes statements and lazy loads inside the block to name.
+        '''
+        previous, self._operation = self._operation, name
+        try:
+            yield self
+        finally:
+            self._operation = previous
+        self._check(self.findings_for(name))
+
+    def _check(self, findings):
+        if findings and self.raise_on_detect:
+            raise NPlusOneError('N+1 lazy loads detected:\n' + '\n'.join('  %s' % f for f in findings))
+
+    @property
+    def findings(self):
+        return [f for f in self._lazy_loads.values() if len(f.parents) >= self.threshold]
+
+    def findings_for(self, operation):
+        return [f for f in self.findings if f.operation == operation]
+
+    def report(self):
+        lines = ['statements per operation:']
+        for operation, count in self.statements.items():
+            lines.append('  %s: %s' % (operation, count))
+        findings = self.findings
+        lines.append('N+1 findings: %s' % len(findings))
+        for finding in findings:
+            lines.append('  %s' % finding)
+            lines.append('    %s' % ' '.join(finding.statement.split()))
+        return '\n'.join(lines)
+
+
+def main():
+    '''
+    Runs the loops from a_1, b_1 and e_1 on a few more rows than the
+    examples and prints what the detector finds.
+    '''
+    from sqlalchemy import create_engine
+    from models import one_to_many, many_to_one, association_object as assoc
+
+    engine = create_engine('sqlite://')
+    for models in (one_to_many, many_to_one, assoc):
+        models.Base.metadata.create_all(bind=engine)
+    session = Session(bind=engine)
+
+    for i in range(10):
+        session.add(one_to_many.Person(name='person %s' % i, offences=[
+            one_to_many.Offence(description='offence %s.%s' % (i, j)) for j in range(3)]))
+        website = many_to_one.Website(url='https://example.com/%s' % i)
+        session.add(many_to_one.User(name='user %s' % i, website=website))
+        session.add(assoc.Human(name='human %s' % i, carsAssoc=[
+            assoc.HumanCarAssociation(cars=assoc.Car(model='car %s.%s' % (i, j))) for j in range(2)]))
+    session.commit()
+    session.close()
+
+    detector = NPlusOneDetector()
+    with detector:
+        session = Session(bind=engine)
+        with detector.operation('a_1 offences'):
+            for person in session.query(one_to_many.Person):
+                for offence in person.offences:
+                    offence.description
+        with detector.operation('b_1 websites'):
+            for user_query in session.query(many_to_one.User):
+                user_query.website.url
+        with detector.operation('e_1 cars'):
+            for person in session.query(assoc.Human):
+                for cars in person.carsAssoc:
+                    cars.cars.model
+        session.close()
+    print(detector.report())
+
+
+if __name__ == '__main__':
+    main()
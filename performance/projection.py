@@ -0,0 +1,153 @@
+'''
+Column projection for the one to one Humanoid/BarCode pair: the loader
+options for full and projected entity loads, a row tuple path for
+bot_info() style reports, and a benchmark of bytes fetched and objects
+built per 100k bots.
+
+    for row in bot_report(session):
+        print(format_bot_info(row))
+
+    python performance/projection.py --bots 100000 --complaint-size 2000
+'''
+import argparse
+import time
+from collections import namedtuple
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker, joinedload, load_only, undefer_group
+
+from bench import print_table
+from models.one_to_one import Base, Humanoid, BarCode
+
+# everything, what the c_1 example loads
+FULL = (undefer_group('details'), joinedload(Humanoid.barcode).undefer_group('crypto'))
+
+# just enough to name a bot and its barcode
+PROJECTED = (load_only(Humanoid.id, Humanoid.name), joinedload(Humanoid.barcode).load_only(BarCode.actual))
+
+# the bot_info() columns as plain rows, in the order format_bot_info() reads them
+BOT_INFO_COLUMNS = (Humanoid.id, Humanoid.name, BarCode.actual, Humanoid.date_initiated,
+                    BarCode.encryption_type, Humanoid.complaint)
+
+
+# the same fields for bots loaded as entities
+BotInfo = namedtuple('BotInfo', 'id name actual date_initiated encryption_type complaint')
+
+
+def bot_report(session, *criteria):
+    '''
+    bot_info() rows without building a single ORM object.
+    '''
+    return session.execute(select(*BOT_INFO_COLUMNS).join(Humanoid.barcode).where(*criteria))
+
+
+def format_bot_info(row):
+    '''
+    The text bot_info() prints, from a bot_report() row.
+    '''
+    return '\n'.join([
+        '===============++++===============',
+        'Now analysing bot id: %s' % row.id,
+        'Bot Name: %s' % row.name,
+        'Bot barcode: %s' % row.actual,
+        'Initial Date bot came online: %s' % row.date_initiated,
+        'Is bot Encrypted: %s' % bool(len(row.encryption_type or '')),
+        'Bot complaint: %s' % row.complaint,
+        'Analysis is finished.',
+        '===============++++===============\n',
+    ])
+
+
+class FetchMeter(object):
+    '''
+    Counts the bytes of every SELECT result on an engine, by asking sqlite
+    for the byte length of each result column of the same statement, and
+    the Humanoid and BarCode objects the ORM builds.
+    '''
+    def __init__(self, engine):
+        self.engine = engine
+        self.bytes = 0
+        self.objects = 0
+        self._selects = []
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if cursor.description and statement.lstrip().upper().startswith('SELECT'):
+            self._selects.append((statement, parameters, [d[0] for d in cursor.description]))
+
+    def _load(self, target, context):
+        self.objects += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Humanoid, 'load', self._load)
+        event.listen(BarCode, 'load', self._load)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.remove(Humanoid, 'load', self._load)
+        event.remove(BarCode, 'load', self._load)
+        with self.engine.connect() as conn:
+            for statement, parameters, names in self._selects:
+                lengths = ' + '.join('COALESCE(LENGTH(CAST("%s" AS BLOB)), 0)' % name for name in names)
+                self.bytes += conn.exec_driver_sql(
+                    'SELECT SUM(%s) FROM (%s)' % (lengths, statement), parameters).scalar() or 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bots', type=int, default=100000)
+    parser.add_argument('--complaint-size', type=int, default=2000, help='characters of complaint per bot')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    complaint = ('Bot keeps flipping of little children. ' * (args.complaint_size // 40 + 1))[:args.complaint_size]
+    with engine.begin() as conn:
+        conn.execute(Humanoid.__table__.insert(),
+                     [dict(id=i, name='HalTron%s' % i, complaint=complaint) for i in range(1, args.bots + 1)])
+        conn.execute(BarCode.__table__.insert(),
+                     [dict(id=i, actual='AJX9w8r79w87Tskdjflsdfl%s' % i, encryption_type='SHA256', humanoid_id=i)
+                      for i in range(1, args.bots + 1)])
+    Session = sessionmaker(bind=engine)
+
+    def entities(options):
+        def run(session):
+            for bot in session.query(Humanoid).options(*options):
+                bot.id, bot.name, bot.barcode.actual
+        return run
+
+    def full_report(session):
+        for bot in session.query(Humanoid).options(*FULL):
+            barcode = bot.barcode
+            format_bot_info(BotInfo(bot.id, bot.name, barcode.actual, bot.date_initiated,
+                                    barcode.encryption_type, bot.complaint))
+
+    def tuple_report(session):
+        for row in bot_report(session):
+            format_bot_info(row)
+
+    modes = (
+        ('full entities', entities(FULL)),
+        ('default (deferred groups)', entities(())),
+        ('load_only', entities(PROJECTED)),
+        ('bot_info on entities', full_report),
+        ('bot_info on row tuples', tuple_report),
+    )
+    rows = []
+    for mode, fn in modes:
+        session = Session()
+        with FetchMeter(engine) as meter:
+            start = time.perf_counter()
+            fn(session)
+            seconds = time.perf_counter() - start
+        session.close()
+        rows.append(dict(mode=mode, seconds=seconds, mb_fetched=meter.bytes / 1024.0 / 1024.0,
+                         objects=meter.objects))
+
+    print('%s bots, %s character complaints' % (args.bots, args.complaint_size))
+    print_table(rows, ['mode', 'seconds', 'mb_fetched', 'objects'])
+
+
+if __name__ == '__main__':
+    main()
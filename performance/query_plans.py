@@ -0,0 +1,298 @@
+'''
+Records every statement the relationship workloads (and the exact lookups
+the example scripts make) emit, runs EXPLAIN QUERY PLAN on each one and
+flags full table scans, temp B-trees, automatic indexes and filters that
+python evaluated before they ever reached SQL. Ends with an index
+recommendation per model. Runs entirely offline on sqlite.
+
+    python performance/query_plans.py --size 200 --output plans.json
+'''
+import argparse
+import json
+import re
+from collections import OrderedDict
+
+from sqlalchemy import Table, create_engine, event
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import BinaryExpression, ColumnClause, False_, True_
+from sqlalchemy.sql.selectable import Alias
+from sqlalchemy.orm import sessionmaker
+
+from models import one_to_many, many_to_one, one_to_one, many_to_many, association_object
+from workloads import WORKLOADS
+
+SCAN = re.compile(r'^SCAN (\S+)(?: AS (\S+))?(?: USING (.*))?$')
+AUTOMATIC = re.compile(r'^SEARCH (\S+)(?: AS (\S+))? USING AUTOMATIC (?:COVERING )?INDEX \((\w+)=')
+CONSTANT_WHERE = re.compile(r'\bWHERE\s+(1 = 1|0 = 1|1|0|true|false)\s*($|\bLIMIT\b|\bORDER\b|\bGROUP\b)', re.I | re.M)
+COMPARISONS = ('eq', 'ne', 'lt', 'le', 'gt', 'ge', 'in_op', 'like_op', 'is_', 'is_not')
+
+
+def a_1_queries(Session):
+    Person = one_to_many.Person
+    session = Session()
+    lad = session.query(Person).filter(Person.name == 'person 1').first()
+    for offence in lad.offences:
+        offence.description
+    session.close()
+
+
+def b_1_queries(Session):
+    User, Website = many_to_one.User, many_to_one.Website
+    session = Session()
+    session.query(Website).filter(Website.id == 1).first()
+    user_query = session.query(User).filter(User.name == 'user 1').first()
+    user_query.website.url
+    session.close()
+
+
+def c_1_queries(Session):
+    Humanoid = one_to_one.Humanoid
+    session = Session()
+    # c_1 as it was first written, python turns `is not None` into True
+    # so the filter never reaches SQL
+    session.query(Humanoid).filter(Humanoid.complaint is not None).first()
+    session.query(Humanoid).filter(Humanoid.complaint != None).first()  # noqa: E711
+    session.close()
+
+
+def d_queries(Session):
+    Human, Cat, hc_mapper = many_to_many.Human, many_to_many.Cat, many_to_many.hc_mapper
+    session = Session()
+    session.query(hc_mapper).all()
+    cat_obj = session.query(Cat).filter(Cat.name == 'cat 1').first()
+    for human in cat_obj.humans:
+        human.name
+    human_obj = session.query(Human).filter(Human.name == 'human 1').first()
+    human_obj.cats.remove(human_obj.cats[0])
+    session.commit()
+    session.close()
+
+
+def e_1_queries(Session):
+    Human, HumanCarAssociation = association_object.Human, association_object.HumanCarAssociation
+    session = Session()
+    session.query(HumanCarAssociation).all()
+    association_object.drivers_of_car(session, 1)
+    for cars in session.query(Human).first().carsAssoc:
+        cars.cars.model
+    session.close()
+
+
+# the lookups each example script makes, run after the matching workload
+SCRIPT_QUERIES = {
+    'one_to_many': a_1_queries,
+    'many_to_one': b_1_queries,
+    'one_to_one': c_1_queries,
+    'many_to_many': d_queries,
+    'association_object': e_1_queries,
+}
+
+
+def _unaliased(from_):
+    '''
+    The real table behind a FROM, looking through aliases.
+    '''
+    while isinstance(from_, Alias):
+        from_ = from_.element
+    return from_
+
+
+def _table_of(column):
+    return _unaliased(column.table)
+
+
+def _from_name(compiler, from_):
+    '''
+    The name a table or an alias of one has in the rendered SQL, and so in
+    the plan. Eager loads alias tables anonymously, the compiler picked
+    their <table>_<n> names while rendering and gives the same name again
+    to one of the alias's columns rendered through it.
+    '''
+    if compiler is None or not isinstance(from_, Alias):
+        return from_.name
+    rendered = compiler.process(next(iter(from_.c)))
+    return rendered.rsplit('.', 1)[0].strip(compiler.preparer.initial_quote)
+
+
+def _predicate_columns(statement, compiler=None):
+    '''
+    (name in the plan, column name) for every column compared in a WHERE
+    clause, the outer one and any subquery's, the tables and table aliases
+    used as {name in the plan: table name}, and the (table name, column
+    name) NOT NULL columns tested against NULL.
+    '''
+    columns, froms, null_checks = set(), {}, set()
+    for element in visitors.iterate(statement):
+        if isinstance(element, (Table, Alias)) and isinstance(_unaliased(element), Table):
+            froms[_from_name(compiler, element)] = _unaliased(element).name
+        whereclause = getattr(element, 'whereclause', None)
+        if whereclause is None:
+            continue
+        for clause in visitors.iterate(whereclause):
+            operator = getattr(clause, 'operator', None)
+            if not isinstance(clause, BinaryExpression) or getattr(operator, '__name__', '') not in COMPARISONS:
+                continue
+            for side in (clause.left, clause.right):
+                if not isinstance(side, ColumnClause) or side.table is None:
+                    continue
+                if not isinstance(_table_of(side), Table):
+                    continue  # a subquery's column
+                if operator.__name__ in ('is_', 'is_not') and getattr(side, 'nullable', True) is False:
+                    # NULL tests on a NOT NULL column narrow nothing, no index helps
+                    null_checks.add((_table_of(side).name, side.name))
+                else:
+                    columns.add((_from_name(compiler, side.table), side.name))
+    return columns, froms, null_checks
+
+
+def _constant_filter(statement):
+    whereclause = getattr(statement, 'whereclause', None)
+    if whereclause is None:
+        return False
+    return any(isinstance(element, (True_, False_)) for element in visitors.iterate(whereclause))
+
+
+class PlanRecorder(object):
+    '''
+    Records the distinct statements an engine runs and explains them.
+    '''
+    def __init__(self, engine, source):
+        self.engine = engine
+        self.source = source
+        self._statements = OrderedDict()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or statement in self._statements:
+            return
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            return
+        compiler = compiled = getattr(context, 'compiled', None)
+        if compiled is not None:
+            # the ORM adds eager joins while compiling, the compile state
+            # holds the statement as it was actually rendered
+            state = getattr(compiled, 'compile_state', None)
+            compiled = compiled.statement if getattr(state, 'statement', None) is None else state.statement
+        self._statements[statement] = (parameters, compiled, compiler)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def explain(self):
+        '''
+        One dict per statement: its plan, its issues and the
+        (table, column) pairs that would need an index.
+        '''
+        results = []
+        with self.engine.connect() as conn:
+            for statement, (parameters, compiled, compiler) in self._statements.items():
+                plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+                columns, froms, null_checks = (_predicate_columns(compiled, compiler) if compiled is not None
+                                               else (set(), {}, set()))
+                issues, missing = [], set()
+                for table, column in sorted(null_checks):
+                    issues.append('%s.%s is NOT NULL, testing it against NULL filters nothing' % (table, column))
+                if CONSTANT_WHERE.search(statement) or (compiled is not None and _constant_filter(compiled)):
+                    issues.append('constant WHERE, the filter was evaluated in python and never reached SQL')
+                for detail in plan:
+                    scan, automatic = SCAN.match(detail), AUTOMATIC.match(detail)
+                    if scan and not scan.group(3):
+                        name = scan.group(2) or scan.group(1)
+                        table = froms.get(name)
+                        if table is None:
+                            continue  # a subquery or materialized join, not a table
+                        # only what filters this very alias, the same table
+                        # under another name may well be searched by index
+                        filtered = sorted(c for n, c in columns if n == name)
+                        scanned = table if name == table else '%s as %s' % (table, name)
+                        if filtered:
+                            issues.append('full table scan of %s filtered on %s' % (scanned, ', '.join(filtered)))
+                            missing.update((table, c) for c in filtered)
+                        else:
+                            issues.append('full table scan of %s (nothing in WHERE narrows it)' % scanned)
+                    elif automatic:
+                        issues.append('sqlite built a throwaway index: %s' % detail)
+                        table = froms.get(automatic.group(2) or automatic.group(1))
+                        if table is not None:
+                            missing.add((table, automatic.group(3)))
+                    elif 'TEMP B-TREE' in detail:
+                        issues.append(detail.lower())
+                results.append(dict(source=self.source, statement=' '.join(statement.split()), plan=plan,
+                                    issues=issues, missing=sorted(missing)))
+        return results
+
+
+def recommend(results):
+    '''
+    Index recommendations per model from the explained statements,
+    skipping columns that already lead an index or the primary key.
+    '''
+    models = {}
+    for base in (one_to_many.Base, many_to_one.Base, one_to_one.Base, many_to_many.Base, association_object.Base):
+        for mapper in base.registry.mappers:
+            models[(base.metadata, mapper.local_table.name)] = mapper.class_.__name__
+        for table in base.metadata.tables.values():
+            models.setdefault((base.metadata, table.name), table.name)
+
+    wanted = OrderedDict()
+    for result in results:
+        metadata = WORKLOADS[result['source']][0]
+        for table_name, column in result['missing']:
+            table = metadata.tables.get(table_name)
+            if table is None:
+                continue
+            leading = set(list(index.columns)[0].name for index in table.indexes)
+            leading.update(c.name for c in list(table.primary_key.columns)[:1])
+            if column in leading:
+                continue
+            model = models.get((metadata, table_name), table_name)
+            wanted.setdefault((model, table_name), set()).add(column)
+    return [dict(model=model, table=table, columns=sorted(columns),
+                 suggestion=["Index('ix_%s_%s', '%s')" % (table, c, c) for c in sorted(columns)])
+            for (model, table), columns in wanted.items()]
+
+
+def run(size):
+    results = []
+    for name, (metadata, workload) in WORKLOADS.items():
+        engine = create_engine('sqlite://')
+        metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        with PlanRecorder(engine, name) as recorder:
+            workload(Session, size)
+            SCRIPT_QUERIES[name](Session)
+        results.extend(recorder.explain())
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--all', action='store_true', help='list statements without issues too')
+    parser.add_argument('--output', help='write statements, plans and recommendations as JSON')
+    args = parser.parse_args()
+
+    results = run(args.size)
+    recommendations = recommend(results)
+    for result in results:
+        if result['issues'] or args.all:
+            print('[%s] %s' % (result['source'], result['statement']))
+            for detail in result['plan']:
+                print('    plan: %s' % detail)
+            for issue in result['issues']:
+                print('    !! %s' % issue)
+    print('\n%s statements explained, %s with issues' % (len(results), len([r for r in results if r['issues']])))
+    print('\nindex recommendations:')
+    for rec in recommendations:
+        print('  %s (%s): %s' % (rec['model'], rec['table'], ', '.join(rec['suggestion'])))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(statements=results, recommendations=recommendations), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+'''
+Read only records for the report loops: the offences loop in a_1,
+get_cats() in d_1, the hc_mapper dump and bot_info() in c_1 only print a
+few attributes, yet every row becomes an ORM object with instance state,
+an identity map entry and attribute events. `records()` runs a column
+select and builds one small immutable record per row straight from the
+result, a namedtuple or (slots=True) a frozen __slots__ dataclass.
+
+    for cat in records(session, cats_of(1), 'Cat'):
+        print("cat_id: %s | cat_name: %s" % (cat.id, cat.name))
+
+    python performance/records.py --rows 1000000
+'''
+import argparse
+import time
+import tracemalloc
+from collections import namedtuple
+from dataclasses import make_dataclass
+from itertools import starmap
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from models import many_to_many, one_to_many
+
+# record classes by (name, fields, slots), every call returns the same class
+_CLASSES = {}
+
+
+def record_class(name, fields, slots=False):
+    '''
+    An immutable record class with fields: a namedtuple, or with slots=True
+    a frozen dataclass with __slots__ (smaller, but no tuple behaviour).
+    '''
+    key = (name, tuple(fields), slots)
+    if key not in _CLASSES:
+        if slots:
+            _CLASSES[key] = make_dataclass(name, fields, frozen=True, slots=True)
+        else:
+            _CLASSES[key] = namedtuple(name, fields)
+    return _CLASSES[key]
+
+
+def records(session, statement, name='Record', slots=False, chunk_size=10000):
+    '''
+    Runs statement, a select of columns, and yields one record per row
+    named after the selected columns. Rows are fetched chunk_size at a
+    time so a million of them never sit in the result at once.
+    '''
+    result = session.execute(statement.execution_options(yield_per=chunk_size))
+    record = record_class(name, result.keys(), slots)
+    for part in result.partitions():
+        for item in starmap(record, part):
+            yield item
+
+
+def offences_of(person_name):
+    '''
+    The a_1 loop, "offence: %s" for each offence of a person.
+    '''
+    Person, Offence = one_to_many.Person, one_to_many.Offence
+    return select(Offence.id, Offence.description).join(Person, Person.id == Offence.person_id) \
+        .where(Person.name == person_name)
+
+
+def cats_of(human_id):
+    '''
+    get_cats() in d_1, the cat_id and cat_name of a human's cats.
+    '''
+    Cat, hc_mapper = many_to_many.Cat, many_to_many.hc_mapper
+    return select(Cat.id, Cat.name).join(hc_mapper, hc_mapper.c.cat_id == Cat.id) \
+        .where(hc_mapper.c.human_id == human_id)
+
+
+def links(table=many_to_many.hc_mapper):
+    '''
+    The mapper table dump at the end of d_1 - d_4.
+    '''
+    return select(*table.c)
+
+
+def bots():
+    '''
+    bot_info() in c_1, see projection.format_bot_info().
+    '''
+    from projection import BOT_INFO_COLUMNS
+    from models.one_to_one import Humanoid
+    return select(*BOT_INFO_COLUMNS).join(Humanoid.barcode)
+
+
+def main():
+    Person, Offence = one_to_many.Person, one_to_many.Offence
+    Cat = many_to_many.Cat
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    one_to_many.Base.metadata.create_all(bind=engine)
+    many_to_many.Base.metadata.create_all(bind=engine)
+    persons = max(args.rows // 10, 1)
+    with engine.begin() as conn:
+        conn.execute(Person.__table__.insert(), [dict(id=i, name='person %s' % i) for i in range(1, persons + 1)])
+        conn.execute(Offence.__table__.insert(), [dict(id=i, person_id=i % persons + 1, description='offence %s' % i)
+                                                  for i in range(1, args.rows + 1)])
+        conn.execute(Cat.__table__.insert(), [dict(id=i, name='cat %s' % i) for i in range(1, args.rows + 1)])
+    Session = sessionmaker(bind=engine)
+
+    def entities(model):
+        def fetch(session):
+            return session.scalars(select(model).execution_options(yield_per=args.chunk_size))
+        return fetch
+
+    def rows_of(statement):
+        def fetch(session):
+            return session.execute(statement.execution_options(yield_per=args.chunk_size))
+        return fetch
+
+    def records_of(statement, name, slots):
+        def fetch(session):
+            return records(session, statement, name, slots, args.chunk_size)
+        return fetch
+
+    # (table, how they print, the fields printed, how the rows are read)
+    offences = select(Offence.id, Offence.description)
+    cats = select(Cat.id, Cat.name)
+    cases = (
+        ('offences', 'offence: %s', ('description',), (
+            ('entities', entities(Offence)),
+            ('Row', rows_of(offences)),
+            ('namedtuple', records_of(offences, 'Offence', False)),
+            ('slots', records_of(offences, 'Offence', True)))),
+        ('cats', 'cat_id: %s | cat_name: %s', ('id', 'name'), (
+            ('entities', entities(Cat)),
+            ('Row', rows_of(cats)),
+            ('namedtuple', records_of(cats, 'Cat', False)),
+            ('slots', records_of(cats, 'Cat', True)))),
+    )
+    results = []
+    for table, line, fields, modes in cases:
+        for mode, fetch in modes:
+            # the report loop, timed without tracemalloc
+            session = Session()
+            start = time.perf_counter()
+            for item in fetch(session):
+                line % tuple(getattr(item, field) for field in fields)
+            seconds = time.perf_counter() - start
+            session.close()
+
+            # every row kept, what is still allocated afterwards is what
+            # a row costs to hold, the peak adds what it cost to build
+            session = Session()
+            tracemalloc.start()
+            kept = list(fetch(session))
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            count = len(kept)
+            del kept
+            session.close()
+            results.append(dict(table=table, mode=mode, rows=count, rows_per_s='%.0f' % (count / seconds),
+                                bytes_per_row='%.0f' % (current / float(count)),
+                                peak_mb='%.1f' % (peak / 1048576.0)))
+
+    print_table(results, ['table', 'mode', 'rows', 'rows_per_s', 'bytes_per_row', 'peak_mb'])
+
+
+if __name__ == '__main__':
+    main()
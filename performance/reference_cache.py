@@ -0,0 +1,206 @@
+'''
+A process wide read through cache for reference style rows that lots of
+other rows point at, Website in b_1 or Car in e_1.
+
+The cache keeps a snapshot of each row's columns (never a live object, a
+session can't share those) and rebuilds it straight into the asking
+session's identity map. A many to one lazy load on a simple foreign key
+looks in the identity map first, so once the target is there
+user.website costs no SQL at all.
+
+    cache = ReferenceCache(maxsize=10000, ttl=300)
+    cache.listen(Session)
+    cache.resolve(session, user, User.website).url
+
+    python performance/reference_cache.py --users 1000000 --websites 1000
+'''
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session, sessionmaker, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bench import StatementCounter, print_table
+from models.many_to_one import Base, User, Website
+
+
+class ReferenceCache(object):
+    '''
+    LRU of at most maxsize rows, each one good for ttl seconds.
+    '''
+    def __init__(self, maxsize=10000, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model, ident):
+        return model, ident if isinstance(ident, tuple) else (ident,)
+
+    def get(self, session, model, ident):
+        '''
+        The model row with primary key ident as an object of session,
+        loaded from the database on a miss. None if there is no such row.
+        '''
+        key = self._key(model, ident)
+        obj = session.identity_map.get(inspect(model).identity_key_from_primary_key(key[1]))
+        if obj is not None:
+            return obj
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            obj = session.get(model, key[1])
+            if obj is not None:
+                self._put(key, obj)
+            return obj
+        return self._rebuild(session, model, entry[1])
+
+    def resolve(self, session, parent, attribute):
+        '''
+        parent.<many to one attribute>, with the target coming from the cache.
+        Only for relationships whose remote columns are the target's whole
+        primary key, the only ones the cache (and the lazy load's identity
+        map lookup) can answer.
+        '''
+        prop = attribute.property
+        locals_by_remote = dict((remote, local) for local, remote in prop.local_remote_pairs)
+        primary_key = prop.mapper.primary_key
+        if set(locals_by_remote) != set(primary_key):
+            raise ValueError('%s does not point at the primary key of %s' % (attribute, prop.mapper.class_.__name__))
+        parent_mapper = inspect(parent).mapper
+        # in the order of the target's primary key, the order get() builds
+        # the identity key from
+        ident = tuple(getattr(parent, parent_mapper.get_property_by_column(locals_by_remote[column]).key)
+                      for column in primary_key)
+        # hold on to the target, the identity map only keeps a weak
+        # reference and the lazy load below has to find it there
+        target = None
+        if None not in ident:
+            target = self.get(session, prop.mapper.class_, ident)
+        value = getattr(parent, prop.key)
+        del target
+        return value
+
+    def invalidate(self, model, ident):
+        with self._lock:
+            if self._entries.pop(self._key(model, ident), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    expirations=self.expirations, invalidations=self.invalidations)
+
+    def listen(self, target=Session):
+        '''
+        Invalidates cached rows changed or deleted by a session of target
+        (a Session class, sessionmaker or session) once it commits.
+        '''
+        event.listen(target, 'after_flush', self._after_flush)
+        event.listen(target, 'after_commit', self._after_commit)
+        event.listen(target, 'after_rollback', self._after_rollback)
+
+    def _put(self, key, obj):
+        mapper = inspect(obj).mapper
+        snapshot = dict((attr.key, getattr(obj, attr.key)) for attr in mapper.column_attrs)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _rebuild(session, model, snapshot):
+        obj = inspect(model).class_manager.new_instance()
+        for key, value in snapshot.items():
+            set_committed_value(obj, key, value)
+        make_transient_to_detached(obj)
+        session.add(obj)
+        return obj
+
+    def _after_flush(self, session, flush_context):
+        # dirty and deleted still show what this flush wrote
+        stale = session.info.setdefault('reference_cache_stale', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            state = inspect(obj)
+            if state.identity is not None:
+                stale.add(self._key(state.class_, state.identity))
+
+    def _after_commit(self, session):
+        for model, ident in session.info.pop('reference_cache_stale', ()):
+            self.invalidate(model, ident)
+
+    def _after_rollback(self, session):
+        session.info.pop('reference_cache_stale', None)
+
+
+def resolve_all(Session, users, batch, cache=None):
+    '''
+    Reads user.website.url for every user, batch users per session.
+    '''
+    for offset in range(0, users, batch):
+        session = Session()
+        query = session.query(User).filter(User.id > offset, User.id <= offset + batch)
+        for user in query:
+            if cache is None:
+                user.website.url
+            else:
+                cache.resolve(session, user, User.website).url
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--websites', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=10000, help='users per session')
+    parser.add_argument('--maxsize', type=int, default=10000)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(Website.__table__.insert(),
+                     [dict(id=i, url='https://example.com/%s' % i) for i in range(1, args.websites + 1)])
+        conn.execute(User.__table__.insert(),
+                     [dict(id=i, name='user %s' % i, website_id=i % args.websites + 1) for i in range(1, args.users + 1)])
+    Session = sessionmaker(bind=engine)
+
+    rows = []
+    cache = ReferenceCache(maxsize=args.maxsize)
+    cache.listen(Session)
+    for mode, mode_cache in (('no cache', None), ('cache', cache)):
+        with StatementCounter(engine) as counter:
+            start = time.perf_counter()
+            resolve_all(Session, args.users, args.batch, mode_cache)
+            seconds = time.perf_counter() - start
+        row = dict(mode=mode, seconds=seconds, users_per_sec=int(args.users / seconds), queries=counter.count)
+        if mode_cache is not None:
+            row.update(mode_cache.stats())
+        rows.append(row)
+
+    print('%s users sharing %s websites, %s users per session' % (args.users, args.websites, args.batch))
+    print_table(rows, ['mode', 'seconds', 'users_per_sec', 'queries', 'hits', 'misses', 'evictions'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+'''
+Inserts that bring primary keys and server generated defaults back in
+the INSERT itself, and commits that don't expire what was just written.
+
+c_1 reads `bot1.id` right after `session.commit()`, commit expired the
+object so that read is a refresh SELECT. `Humanoid` and
+`HumanCarAssociation` now have eager_defaults, their flush INSERTs carry
+`RETURNING id, date_initiated` (sqlite 3.35+). `insert_returning()` goes
+further and inserts a whole list as one ORM bulk INSERT .. RETURNING, and
+`commit_no_expire()` commits without throwing the loaded state away.
+
+    bots = insert_returning(session, Humanoid, [dict(name=..., complaint=...), ...])
+    commit_no_expire(session)
+    bots[0].id, bots[0].date_initiated  # no SELECT
+
+    python performance/returning.py --rows 10000
+'''
+import argparse
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.orm import sessionmaker, undefer
+
+from bench import StatementCounter, print_table
+
+
+def _undefer_defaults(model):
+    '''
+    undefer() for the deferred columns the database fills in, RETURNING
+    leaves deferred columns out like a SELECT would.
+    '''
+    return [undefer(getattr(model, prop.key)) for prop in inspect(model).column_attrs
+            if prop.deferred and any(c.default is not None or c.server_default is not None for c in prop.columns)]
+
+
+def insert_returning(session, model, rows, ordered=False):
+    '''
+    Inserts rows (dicts of column values) as one ORM bulk INSERT and
+    returns the new objects with their ids and defaults loaded.
+
+    The objects come back in database order. ordered=True returns them in
+    the order of rows, which sqlite can only guarantee one row per
+    statement.
+    '''
+    statement = insert(model).returning(model, sort_by_parameter_order=ordered)
+    statement = statement.options(*_undefer_defaults(model))
+    return session.scalars(statement, rows).all()
+
+
+@contextmanager
+def no_expire(session):
+    '''
+    Commits inside the block leave loaded attributes alone.
+    '''
+    previous, session.expire_on_commit = session.expire_on_commit, False
+    try:
+        yield session
+    finally:
+        session.expire_on_commit = previous
+
+
+def commit_no_expire(session):
+    '''
+    session.commit() that keeps every object's state. Nothing is
+    refreshed afterwards either, changes made by others stay invisible
+    until the objects are expired or queried again.
+    '''
+    with no_expire(session):
+        session.commit()
+
+
+def humanoids_c_1(session, rows):
+    from models.one_to_one import Humanoid
+    bots = [Humanoid(**row) for row in rows]
+    session.add_all(bots)
+    session.commit()
+    return bots
+
+
+def humanoids_no_expire(session, rows):
+    from models.one_to_one import Humanoid
+    bots = [Humanoid(**row) for row in rows]
+    session.add_all(bots)
+    commit_no_expire(session)
+    return bots
+
+
+def humanoids_returning(session, rows):
+    from models.one_to_one import Humanoid
+    bots = insert_returning(session, Humanoid, rows)
+    commit_no_expire(session)
+    return bots
+
+
+def links_c_1(session, rows):
+    from models.association_object import HumanCarAssociation
+    links = [HumanCarAssociation(**row) for row in rows]
+    session.add_all(links)
+    session.commit()
+    return links
+
+
+def links_no_expire(session, rows):
+    from models.association_object import HumanCarAssociation
+    links = [HumanCarAssociation(**row) for row in rows]
+    session.add_all(links)
+    commit_no_expire(session)
+    return links
+
+
+def links_returning(session, rows):
+    from models.association_object import HumanCarAssociation
+    links = insert_returning(session, HumanCarAssociation, rows)
+    commit_no_expire(session)
+    return links
+
+
+def main():
+    from models import one_to_one, association_object
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    bots = [dict(name='bot %s' % i, complaint='complaint %s' % i) for i in range(args.rows)]
+    links = [dict(human_id=i // 2 + 1, car_id=i % 2 + 1) for i in range(args.rows)]
+    cases = (
+        ('humanoids', one_to_one, bots, 'date_initiated', (
+            ('c_1 (expire on commit)', humanoids_c_1),
+            ('commit_no_expire', humanoids_no_expire),
+            ('insert_returning', humanoids_returning))),
+        ('human_car_association', association_object, links, 'datetime', (
+            ('c_1 (expire on commit)', links_c_1),
+            ('commit_no_expire', links_no_expire),
+            ('insert_returning', links_returning))),
+    )
+    results = []
+    for table, models, rows, default, modes in cases:
+        for mode, fn in modes:
+            engine = create_engine('sqlite://')
+            models.Base.metadata.create_all(bind=engine)
+            if models is association_object:
+                with engine.begin() as conn:
+                    association_object.seed(conn, args.rows // 2 + 1, 2, 0)
+            session = sessionmaker(bind=engine)()
+            with StatementCounter(engine) as insert_counter:
+                start = time.perf_counter()
+                objects = fn(session, rows)
+                insert_seconds = time.perf_counter() - start
+            # what c_1 does next: read the id (and the default) back
+            with StatementCounter(engine) as read_counter:
+                start = time.perf_counter()
+                for obj in objects:
+                    obj.id, getattr(obj, default)
+                read_seconds = time.perf_counter() - start
+            session.close()
+            engine.dispose()
+            total = insert_counter.count + read_counter.count
+            results.append(dict(table=table, mode=mode, insert=insert_counter.count, read_back=read_counter.count,
+                                per_row='%.3f' % (float(total) / len(rows)),
+                                seconds='%.3f' % (insert_seconds + read_seconds)))
+    print_table(results, ['table', 'mode', 'insert', 'read_back', 'per_row', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
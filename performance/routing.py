@@ -0,0 +1,283 @@
+'''
+A session that writes to a primary and reads from replicas.
+
+Locally the replicas are copies of the primary sqlite file, refreshed
+with sqlite's online backup API by `ReplicaSet.refresh()` (or every
+`interval` seconds by `start_refresher()`). Each replica remembers how
+many primary commits it has seen, a `RoutingSession` that committed
+only reads from replicas that have caught up with its commit and from
+the primary until then, so it always reads its own writes.
+
+    replicas = ReplicaSet.create(2, directory='replicas', strategy='least_loaded')
+    replicas.start_refresher(interval=0.5)
+    Session = sessionmaker(class_=RoutingSession, replicas=replicas)
+
+    python performance/routing.py --replicas 0 1 2 4 --readers 4 --seconds 5
+'''
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from itertools import count
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Select, CompoundSelect
+
+from bench import print_table
+from engines import make_engine
+from models.one_to_many import Base, Person, Offence
+
+STRATEGIES = ('round_robin', 'least_loaded')
+
+
+class Replica(object):
+    '''
+    A copy of the primary, generation is the number of primary commits
+    it is known to contain.
+    '''
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.generation = 0
+
+
+class ReplicaSet(object):
+    '''
+    The primary engine, its replicas and the count of primary commits.
+    '''
+    def __init__(self, primary, replicas, strategy='round_robin'):
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown strategy %r, pick one of %s' % (strategy, ', '.join(STRATEGIES)))
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.generation = 0
+        self._turn = count()
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+        # set by create() when it made a temporary directory, dispose() removes it
+        self.owned_directory = None
+
+    @classmethod
+    def create(cls, replicas, directory=None, config='file', strategy='round_robin'):
+        '''
+        A fresh primary database with the tables created and replicas
+        copies of it, all in directory (a temporary one by default,
+        removed again by dispose()).
+        '''
+        owned = directory is None
+        directory = directory or tempfile.mkdtemp(prefix='replicas')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        primary = make_engine(config, path=os.path.join(directory, 'primary.db'))
+        Base.metadata.create_all(bind=primary)
+        copies = []
+        for i in range(replicas):
+            path = os.path.join(directory, 'replica_%s.db' % i)
+            copies.append(Replica(make_engine('file', path=path), path))
+        replica_set = cls(primary, copies, strategy)
+        if owned:
+            replica_set.owned_directory = directory
+        replica_set.refresh()
+        return replica_set
+
+    def committed(self):
+        '''
+        Counts a commit the primary has finished and returns the new
+        generation. RoutingSession calls it after each commit that wrote,
+        call it yourself after writing to the primary some other way.
+        '''
+        with self._lock:
+            self.generation += 1
+            return self.generation
+
+    def refresh(self):
+        '''
+        Copies the primary over every replica with the backup API. The
+        generation is read before copying, so a replica never claims a
+        commit it might have missed.
+        '''
+        for replica in self.replicas:
+            generation = self.generation
+            source = self.primary.raw_connection()
+            try:
+                target = sqlite3.connect(replica.path, timeout=30)
+                try:
+                    source.driver_connection.backup(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+            replica.generation = generation
+
+    def start_refresher(self, interval=1.0):
+        def run():
+            while not self._stop.wait(interval):
+                self.refresh()
+        self._stop.clear()
+        self._refresher = threading.Thread(target=run, name='replica refresher', daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        if self._refresher is not None:
+            self._stop.set()
+            self._refresher.join()
+            self._refresher = None
+
+    def pick(self, min_generation=0):
+        '''
+        A replica that has seen at least min_generation commits, None
+        when no replica has caught up yet.
+        '''
+        candidates = [r for r in self.replicas if r.generation >= min_generation]
+        if not candidates:
+            return None
+        if self.strategy == 'least_loaded':
+            # connections checked out of each replica's pool right now
+            return min(candidates, key=lambda r: r.engine.pool.checkedout())
+        return candidates[next(self._turn) % len(candidates)]
+
+    def dispose(self):
+        self.stop_refresher()
+        self.primary.dispose()
+        for replica in self.replicas:
+            replica.engine.dispose()
+        if self.owned_directory is not None:
+            shutil.rmtree(self.owned_directory, ignore_errors=True)
+            self.owned_directory = None
+
+
+class RoutingSession(Session):
+    '''
+    SELECTs go to a replica, everything else (flushes, UPDATE/DELETE
+    statements, text) to the primary. Once a transaction has flushed it
+    stays on the primary, and after committing it only reads from
+    replicas that contain that commit. A transaction reads from one
+    replica, a lazy load sees the same copy as the query before it.
+    '''
+    def __init__(self, replicas, **kwargs):
+        super(RoutingSession, self).__init__(**kwargs)
+        self.replicas = replicas
+        self.min_generation = 0
+        self.wrote = False
+        self.replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or self.wrote or not isinstance(clause, (Select, CompoundSelect)):
+            return self.replicas.primary
+        if self.replica is None:
+            self.replica = self.replicas.pick(self.min_generation)
+        return self.replica.engine if self.replica is not None else self.replicas.primary
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.wrote:
+        # read your writes, the commit is on disk by now so any copy
+        # taken from here on contains it
+        session.min_generation = session.replicas.committed()
+    session.wrote = False
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.wrote = False
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    session.replica = None
+
+
+def _seed(engine, persons):
+    with engine.begin() as conn:
+        conn.execute(Person.__table__.insert(), [dict(id=i, name='person %s' % i) for i in range(1, persons + 1)])
+        conn.execute(Offence.__table__.insert(), [dict(person_id=i, description='offence %s' % i)
+                                                  for i in range(1, persons + 1)])
+
+
+def mixed_load(Session, persons, readers, seconds):
+    '''
+    readers threads look up a person and their offences, one writer logs
+    an offence and reads it straight back after the commit. Returns
+    reads, writes and writes that could not read themselves back.
+    '''
+    stop = time.perf_counter() + seconds
+    counts = dict(reads=0, writes=0, unseen=0)
+    lock = threading.Lock()
+
+    def reader(seed):
+        rand = random.Random(seed)
+        reads = 0
+        while time.perf_counter() < stop:
+            session = Session()
+            person = session.get(Person, rand.randint(1, persons))
+            len(person.offences)
+            session.close()
+            reads += 1
+        with lock:
+            counts['reads'] += reads
+
+    def writer():
+        rand = random.Random(0)
+        session = Session()
+        while time.perf_counter() < stop:
+            description = 'written %s' % counts['writes']
+            session.add(Offence(person_id=rand.randint(1, persons), description=description))
+            session.commit()
+            session.expunge_all()
+            if session.query(Offence).filter(Offence.description == description).first() is None:
+                counts['unseen'] += 1
+            session.commit()
+            counts['writes'] += 1
+        session.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--replicas', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--strategy', choices=STRATEGIES, nargs='+', default=list(STRATEGIES))
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--persons', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between replica refreshes')
+    args = parser.parse_args()
+
+    rows = []
+    for replicas in args.replicas:
+        for strategy in (args.strategy if replicas else args.strategy[:1]):
+            replica_set = ReplicaSet.create(replicas, strategy=strategy)
+            _seed(replica_set.primary, args.persons)
+            replica_set.refresh()
+            replica_set.start_refresher(args.interval)
+            Session = sessionmaker(class_=RoutingSession, replicas=replica_set)
+            counts = mixed_load(Session, args.persons, args.readers, args.seconds)
+            replica_set.dispose()
+            rows.append(dict(replicas=replicas, strategy=strategy if replicas else '-',
+                             reads_per_s='%.0f' % (counts['reads'] / args.seconds),
+                             writes_per_s='%.0f' % (counts['writes'] / args.seconds),
+                             unseen_writes=counts['unseen']))
+    print_table(rows, ['replicas', 'strategy', 'reads_per_s', 'writes_per_s', 'unseen_writes'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+'''
+Person/Offence split across several sqlite files.
+
+A person lives on shard crc32(name) % N and their offences live with
+them. Person ids are handed out so that id % N is the shard, which lets
+an offence (or a get() by id) find its shard without asking around.
+`ShardSet.session()` is a ShardedSession for the a_1 style ORM code,
+`ShardSet.fan_out()` runs one statement on every shard at once in a
+thread or process pool and merges the rows.
+
+    shards = ShardSet.create(4, directory='shards')
+    session = shards.session()
+    session.add(Person(name='L. Lad', offences=[Offence(description='Public nudity.')]))
+    session.commit()
+    rows = shards.fan_out(select(Offence.person_id, Offence.description)
+                          .where(Offence.description.like('%nudity%')))
+
+    python performance/sharding.py --shards 1 2 4 8 --persons 100000
+'''
+import argparse
+import heapq
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.ext.horizontal_shard import ShardedSession, set_shard_id
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from bulk_ingest import chunks
+from engines import make_engine
+from models.one_to_many import Base, Person, Offence
+
+# engines opened by _query_shard, one per url per process
+_ENGINES = {}
+
+
+def _query_shard(url, sql, args):
+    '''
+    Runs compiled SQL on one shard and returns plain tuples. Module level
+    so a process pool can pickle it.
+    '''
+    engine = _ENGINES.get(url)
+    if engine is None:
+        engine = _ENGINES[url] = create_engine(url)
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.exec_driver_sql(sql, args)]
+
+
+def shard_for_name(name, count):
+    '''
+    The shard a person's name maps to, stable across processes unlike hash().
+    '''
+    return zlib.crc32(name.encode('utf-8')) % count
+
+
+class ShardSet(object):
+    '''
+    count sqlite files, shard ids are the integers 0 .. count - 1.
+    '''
+    def __init__(self, engines, executor='thread', workers=None):
+        self.engines = dict(enumerate(engines))
+        self.count = len(self.engines)
+        pool = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        self.pool = pool(max_workers=workers or self.count)
+        self._next_ids = {}
+        self._ids_lock = threading.Lock()
+        # set by create() when it made a temporary directory, close() removes it
+        self.owned_directory = None
+        self.Session = sessionmaker(class_=ShardedSession, shards=self.engines,
+                                    shard_chooser=self._shard_chooser,
+                                    identity_chooser=self._identity_chooser,
+                                    execute_chooser=self._execute_chooser)
+        event.listen(self.Session, 'before_flush', self._assign_person_ids)
+
+    @classmethod
+    def create(cls, count, directory=None, config='wal', **kwargs):
+        '''
+        A ShardSet on count fresh database files in directory (a temporary
+        one by default, removed again by close()) with the tables created.
+        '''
+        owned = directory is None
+        directory = directory or tempfile.mkdtemp(prefix='shards')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        engines = []
+        for shard in range(count):
+            engine = make_engine(config, path=os.path.join(directory, 'shard_%s.db' % shard))
+            Base.metadata.create_all(bind=engine)
+            engines.append(engine)
+        shard_set = cls(engines, **kwargs)
+        if owned:
+            shard_set.owned_directory = directory
+        return shard_set
+
+    def close(self):
+        self.pool.shutdown()
+        for engine in self.engines.values():
+            engine.dispose()
+            # the engine _query_shard opened for it in this process
+            cached = _ENGINES.pop(str(engine.url), None)
+            if cached is not None:
+                cached.dispose()
+        if self.owned_directory is not None:
+            shutil.rmtree(self.owned_directory, ignore_errors=True)
+            self.owned_directory = None
+
+    def session(self, **kwargs):
+        return self.Session(**kwargs)
+
+    def _shard_chooser(self, mapper, instance, clause=None):
+        if isinstance(instance, Person):
+            return shard_for_name(instance.name, self.count)
+        if isinstance(instance, Offence) and instance.person_id is not None:
+            return instance.person_id % self.count
+        raise ValueError('cannot tell which shard %r belongs to' % instance)
+
+    def _identity_chooser(self, mapper, primary_key, **kwargs):
+        if mapper.class_ is Person:
+            return [primary_key[0] % self.count]
+        # offence ids are only unique within a shard
+        return list(self.engines)
+
+    def _execute_chooser(self, orm_context):
+        if orm_context.lazy_loaded_from is not None:
+            return [orm_context.lazy_loaded_from.identity_token]
+        return list(self.engines)
+
+    def _next_person_id(self, shard):
+        '''
+        Ids of shard s are k * N + s for k = 1, 2, ... picking up after
+        the highest id already in the file.
+        '''
+        with self._ids_lock:
+            if shard not in self._next_ids:
+                with self.engines[shard].connect() as conn:
+                    top = conn.execute(select(func.max(Person.id))).scalar()
+                self._next_ids[shard] = (top - shard) // self.count if top else 0
+            self._next_ids[shard] += 1
+            return self._next_ids[shard] * self.count + shard
+
+    def _assign_person_ids(self, session, flush_context, instances):
+        for obj in session.new:
+            if isinstance(obj, Person) and obj.id is None:
+                obj.id = self._next_person_id(shard_for_name(obj.name, self.count))
+
+    def person_by_name(self, session, name):
+        '''
+        a_1's lookup by name, sent to the one shard the name lives on.
+        '''
+        return session.execute(
+            select(Person).where(Person.name == name).options(set_shard_id(shard_for_name(name, self.count)))
+        ).scalars().first()
+
+    def _compile(self, statement):
+        # expanding IN parameters rendered as one ? each, not a
+        # [POSTCOMPILE] placeholder the driver can't read
+        compiled = statement.compile(dialect=self.engines[0].dialect, compile_kwargs={'render_postcompile': True})
+        params = compiled.construct_params()
+        return str(compiled), tuple(params[key] for key in compiled.positiontup)
+
+    def fan_out(self, statement, key=None, limit=None):
+        '''
+        Runs a core statement on every shard in parallel and returns the
+        rows as tuples. With key the shards' rows are merged in key order
+        (give each shard the same ORDER BY), limit cuts the merged result.
+        '''
+        sql, args = self._compile(statement)
+        futures = [self.pool.submit(_query_shard, str(engine.url), sql, args)
+                   for engine in self.engines.values()]
+        results = [future.result() for future in futures]
+        rows = heapq.merge(*results, key=key) if key is not None else chain(*results)
+        return list(rows if limit is None else (row for _, row in zip(range(limit), rows)))
+
+    def bulk_insert(self, records, batch_size=10000):
+        '''
+        Inserts (person_name, [descriptions]) records with core executemany,
+        every shard's rows written by its own worker thread.
+        '''
+        by_shard = dict((shard, ([], [])) for shard in self.engines)
+        for name, descriptions in records:
+            shard = shard_for_name(name, self.count)
+            person_id = self._next_person_id(shard)
+            persons, offences = by_shard[shard]
+            persons.append(dict(id=person_id, name=name))
+            offences.extend(dict(person_id=person_id, description=d) for d in descriptions)
+
+        def write(shard):
+            persons, offences = by_shard[shard]
+            with self.engines[shard].begin() as conn:
+                for part in chunks(persons, batch_size):
+                    conn.execute(insert(Person), part)
+                for part in chunks(offences, batch_size):
+                    conn.execute(insert(Offence), part)
+
+        with ThreadPoolExecutor(max_workers=self.count) as writers:
+            list(writers.map(write, self.engines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--persons', type=int, default=100000)
+    parser.add_argument('--offences', type=int, default=3, help='offences per person')
+    parser.add_argument('--queries', type=int, default=50, help='fan out queries timed')
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--directory', help='where the shard files go, a temporary directory by default')
+    args = parser.parse_args()
+
+    records = [('person %s' % i, ['offence %s.%s' % (i, j) for j in range(args.offences)])
+               for i in range(args.persons)]
+    rows = []
+    for count in args.shards:
+        directory = os.path.join(args.directory, str(count)) if args.directory else None
+        shards = ShardSet.create(count, directory, executor=args.executor)
+
+        start = time.perf_counter()
+        shards.bulk_insert(records)
+        insert_seconds = time.perf_counter() - start
+
+        # "all offences matching a description", a scan on every shard,
+        # once bringing every matching row back and once only counting
+        start = time.perf_counter()
+        for i in range(args.queries):
+            matched = shards.fan_out(select(Offence.person_id, Offence.description)
+                                     .where(Offence.description.like('%%.%s' % (i % args.offences)))
+                                     .order_by(Offence.person_id), key=lambda row: row[0])
+        rows_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(args.queries):
+            counted = sum(row[0] for row in shards.fan_out(
+                select(func.count()).where(Offence.description.like('%%%s.%s' % (i, i % args.offences)))))
+        count_seconds = time.perf_counter() - start
+
+        # a_1 through the sharded session, one shard per lookup
+        session = shards.session()
+        start = time.perf_counter()
+        for i in range(0, args.persons, max(args.persons // 1000, 1)):
+            person = shards.person_by_name(session, 'person %s' % i)
+            len(person.offences)
+        lookup_seconds = time.perf_counter() - start
+        lookups = len(range(0, args.persons, max(args.persons // 1000, 1)))
+        session.close()
+        shards.close()
+
+        inserted = args.persons * (args.offences + 1)
+        rows.append(dict(shards=count, inserted_per_s='%.0f' % (inserted / insert_seconds),
+                         matched=len(matched), fetch_per_s='%.1f' % (args.queries / rows_seconds),
+                         counted=counted, count_per_s='%.1f' % (args.queries / count_seconds),
+                         lookups_per_s='%.0f' % (lookups / lookup_seconds)))
+    print_table(rows, ['shards', 'inserted_per_s', 'matched', 'fetch_per_s', 'counted', 'count_per_s',
+                       'lookups_per_s'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+'''
+A registry of named, prebuilt statements for the hot lookups in the
+examples, so they are built once and compiled once instead of on every
+call, plus a micro benchmark of where the time goes.
+
+    from statements import registry
+    human_obj = registry.first(session, 'human_by_id', id=1)
+    lad = registry.first(session, 'person_by_name', name='L. Lad')
+
+    python performance/statements.py --iterations 20000
+'''
+import argparse
+import time
+
+from sqlalchemy import bindparam, create_engine, inspect, lambda_stmt, select
+from sqlalchemy.orm import sessionmaker
+
+from bench import print_table
+from models import one_to_many, many_to_one, one_to_one, many_to_many
+
+
+class StatementRegistry(object):
+    '''
+    Statements are built once with bindparam() placeholders, their compiled
+    form then comes straight out of the engine's compiled cache.
+
+    Entries registered with identity=Model are primary key lookups taking
+    a single `id` parameter. first() answers those from the identity map
+    without any SQL when the object is already there, not expired and not
+    deleted (the only cases where the query could answer differently),
+    and runs the statement otherwise.
+    '''
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name, statement, identity=None):
+        if name in self._entries:
+            raise KeyError('statement %r is already registered' % name)
+        self._entries[name] = (statement, identity)
+        return statement
+
+    def statement(self, name):
+        return self._entries[name][0]
+
+    def names(self):
+        return sorted(self._entries)
+
+    def execute(self, session, name, /, **params):
+        return session.execute(self._entries[name][0], params)
+
+    def first(self, session, name, /, **params):
+        statement, identity = self._entries[name]
+        if identity is not None:
+            obj = session.identity_map.get(session.identity_key(identity, params['id']))
+            if obj is not None and obj not in session.deleted and not inspect(obj).expired_attributes:
+                return obj
+        return session.execute(statement, params).unique().scalars().first()
+
+    def all(self, session, name, /, **params):
+        return session.execute(self._entries[name][0], params).unique().scalars().all()
+
+
+registry = StatementRegistry()
+
+# d_1 - d_4 get_cats()
+registry.register('human_by_id', select(many_to_many.Human)
+                  .where(many_to_many.Human.id == bindparam('id')), identity=many_to_many.Human)
+# a_1 name lookup and the person fetch before the offences loop
+registry.register('person_by_name', select(one_to_many.Person)
+                  .where(one_to_many.Person.name == bindparam('name')).limit(1))
+registry.register('person_by_id', select(one_to_many.Person)
+                  .where(one_to_many.Person.id == bindparam('id')), identity=one_to_many.Person)
+# b_1 user lookup and the website it points at
+registry.register('user_by_name', select(many_to_one.User)
+                  .where(many_to_one.User.name == bindparam('name')).limit(1))
+registry.register('website_by_id', select(many_to_one.Website)
+                  .where(many_to_one.Website.id == bindparam('id')), identity=many_to_one.Website)
+# c_1 bot_info(), the filter the example meant to write
+registry.register('humanoid_with_complaint', select(one_to_one.Humanoid)
+                  .where(one_to_one.Humanoid.complaint.is_not(None)).limit(1))
+registry.register('humanoid_by_id', select(one_to_one.Humanoid)
+                  .where(one_to_one.Humanoid.id == bindparam('id')), identity=one_to_one.Humanoid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--persons', type=int, default=1000)
+    args = parser.parse_args()
+
+    Person = one_to_many.Person
+    engine = create_engine('sqlite://')
+    one_to_many.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(Person.__table__.insert(), [dict(id=i, name='person %s' % i) for i in range(1, args.persons + 1)])
+    session = sessionmaker(bind=engine)()
+    # the identity map only holds weak references, keep the persons alive
+    # like an application holding on to its objects would
+    loaded = session.query(Person).all()
+    names = ['person %s' % (i % args.persons + 1) for i in range(args.iterations)]
+    # the same session and objects again, on an engine without the cache
+    no_cache = engine.execution_options(compiled_cache=None)
+    uncached = sessionmaker(bind=no_cache)()
+    uncached_loaded = uncached.query(Person).all()
+    compiled = registry.statement('person_by_name').compile(engine)
+    raw_sql = str(compiled)
+    positions = compiled.positiontup
+    raw = engine.raw_connection()
+
+    def construct(name):
+        session.query(Person).filter(Person.name == name).limit(1)
+
+    def construct_compile(name):
+        session.query(Person).filter(Person.name == name).limit(1).statement.compile(no_cache)
+
+    def execute_only(name):
+        cursor = raw.cursor()
+        params = compiled.construct_params(dict(name=name))
+        cursor.execute(raw_sql, [params[key] for key in positions])
+        cursor.fetchone()
+        cursor.close()
+
+    def query_uncached(name):
+        uncached.query(Person).filter(Person.name == name).first()
+
+    def query_cached(name):
+        session.query(Person).filter(Person.name == name).first()
+
+    def lambda_query(name):
+        session.execute(lambda_stmt(lambda: select(Person).where(Person.name == name).limit(1))).scalars().first()
+
+    def registered(name):
+        registry.first(session, 'person_by_name', name=name)
+
+    def identity(name):
+        registry.first(session, 'person_by_id', id=int(name.split()[1]))
+
+    modes = (
+        ('construct only', construct),
+        ('construct + compile', construct_compile),
+        ('execute only (driver)', execute_only),
+        ('query, no compiled cache', query_uncached),
+        ('query (a_1 style)', query_cached),
+        ('lambda_stmt', lambda_query),
+        ('registry', registered),
+        ('registry identity map', identity),
+    )
+    rows = []
+    for mode, fn in modes:
+        for name in names[:100]:
+            fn(name)
+        start = time.perf_counter()
+        for name in names:
+            fn(name)
+        seconds = time.perf_counter() - start
+        rows.append(dict(mode=mode, per_sec=int(len(names) / seconds), us_each=seconds * 1e6 / len(names)))
+    raw.close()
+    session.close()
+    uncached.close()
+    del loaded, uncached_loaded
+
+    print('person_by_name lookups, %s iterations' % args.iterations)
+    print_table(rows, ['mode', 'per_sec', 'us_each'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+Streams the link tables (hc_mapper, human_car_association) in fixed size
+chunks instead of pulling them into a list with .all(), plus a
+tracemalloc benchmark of peak memory as the table grows.
+
+    for chunk in stream(session, hc_mapper, chunk_size=10000):
+        for human_id, cat_id in chunk:
+            ...
+
+    python performance/streaming.py --sizes 10000 100000 1000000 10000000
+'''
+import argparse
+import time
+
+from sqlalchemy import create_engine, select, Table
+from sqlalchemy.orm import sessionmaker
+
+from bench import peak_memory, print_table
+from models import many_to_many, association_object
+
+
+def stream(session, target, chunk_size=10000, plain=False):
+    '''
+    Yields lists of at most chunk_size rows from target, a Table (rows) or
+    a mapped class (ORM objects). plain=True yields plain tuples of the
+    columns instead, skipping the ORM.
+
+    yield_per turns on stream_results, which uses a server side cursor
+    where the driver has one (sqlite's cursor already fetches as it goes).
+    Objects aren't kept by the session once a chunk is dropped, as long as
+    nothing changes them.
+    '''
+    if isinstance(target, Table):
+        columns = list(target.columns)
+    else:
+        columns = list(target.__table__.columns)
+    if plain or isinstance(target, Table):
+        result = session.execute(select(*columns).execution_options(yield_per=chunk_size))
+        for part in result.partitions():
+            yield [tuple(row) for row in part] if plain else part
+    else:
+        result = session.execute(select(target).execution_options(yield_per=chunk_size))
+        for part in result.scalars().partitions():
+            yield part
+
+
+def read_all(session, target):
+    '''
+    What the examples do: session.query(...).all().
+    '''
+    return session.query(target).all()
+
+
+def build(size, batch_size=100000):
+    '''
+    hc_mapper and human_car_association with size rows each, written
+    batch_size rows at a time so seeding stays within bounded memory too.
+    '''
+    engine = create_engine('sqlite://')
+    many_to_many.Base.metadata.create_all(bind=engine)
+    # 10 links per human, the last one takes what is left over
+    per_human = min(10, max(size, 1))
+    humans = -(-size // per_human)
+    with engine.begin() as conn:
+        many_to_many.seed(conn, humans, max(humans, per_human), per_human, batch_size=batch_size,
+                          total_links=size)
+    assoc_engine = create_engine('sqlite://')
+    association_object.Base.metadata.create_all(bind=assoc_engine)
+    with assoc_engine.begin() as conn:
+        association_object.seed(conn, humans, max(humans, per_human), per_human, batch_size=batch_size,
+                                total_links=size)
+    return engine, assoc_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=100000, help='rows per insert when seeding')
+    parser.add_argument('--all-max', type=int, default=1000000,
+                        help='skip .all() above this many rows, it runs out of memory')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        engine, assoc_engine = build(size, args.batch_size)
+        targets = (
+            ('hc_mapper', engine, many_to_many.hc_mapper),
+            ('human_car_association', assoc_engine, association_object.HumanCarAssociation),
+        )
+        for name, bind, target in targets:
+            modes = [
+                ('stream', lambda s: sum(len(c) for c in stream(s, target, args.chunk_size))),
+                ('stream plain', lambda s: sum(len(c) for c in stream(s, target, args.chunk_size, plain=True))),
+            ]
+            if size <= args.all_max:
+                modes.insert(0, ('all', lambda s: len(read_all(s, target))))
+            for mode, fn in modes:
+                session = sessionmaker(bind=bind)()
+                with peak_memory() as mem:
+                    start = time.perf_counter()
+                    count = fn(session)
+                    seconds = time.perf_counter() - start
+                session.close()
+                assert count == size, (name, mode, count)
+                rows.append(dict(rows=size, table=name, mode=mode, seconds=seconds,
+                                 peak_mb=mem['peak'] / 1024.0 / 1024.0))
+        engine.dispose()
+        assoc_engine.dispose()
+
+    print('chunks of %s rows, times include tracemalloc overhead' % args.chunk_size)
+    print_table(rows, ['rows', 'table', 'mode', 'seconds', 'peak_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+The relationship scripts as callable workloads.
+
+Each workload does what its script does (create the objects, commit, read
+them back the same way) for `size` parents instead of two or three, and
+without the printing. They take a sessionmaker so the harness decides
+which engine they run on.
+'''
+from sqlalchemy.orm import joinedload, undefer_group
+
+from models import one_to_many, many_to_one, one_to_one, many_to_many, association_object
+
+
+def one_to_many_workload(Session, size):
+    '''
+    a_1: persons with offences, looked up one by one and their offences read.
+    '''
+    Person, Offence = one_to_many.Person, one_to_many.Offence
+    session = Session()
+    for i in range(size):
+        person = Person(name='person %s' % i)
+        person.offences = [Offence(description='offence %s.%s' % (i, j)) for j in range(3)]
+        session.add(person)
+    session.commit()
+    for i in range(1, size + 1):
+        person = session.query(Person).filter(Person.id == i).first()
+        for offence in person.offences:
+            offence.description
+    session.close()
+
+
+def many_to_one_workload(Session, size):
+    '''
+    b_1: users sharing websites, each user found by name and its website url read.
+    '''
+    User, Website = many_to_one.User, many_to_one.Website
+    session = Session()
+    websites = [Website(url='https://example.com/%s' % i) for i in range(size // 10 + 1)]
+    session.add_all([User(name='user %s' % i, website=websites[i % len(websites)]) for i in range(size)])
+    session.commit()
+    for i in range(size):
+        user_query = session.query(User).filter(User.name == 'user %s' % i).first()
+        user_query.website.url
+    session.close()
+
+
+def one_to_one_workload(Session, size):
+    '''
+    c_1: humanoids with a barcode each, all read back through bot_info's attributes.
+    '''
+    Humanoid, BarCode = one_to_one.Humanoid, one_to_one.BarCode
+    session = Session()
+    for i in range(size):
+        bot = Humanoid(name='bot %s' % i, complaint='complaint %s' % i)
+        bot.barcode = BarCode(actual='barcode %s' % i, encryption_type='SHA256')
+        session.add(bot)
+    session.commit()
+    # the example has no deferred columns, load everything like it does
+    query = session.query(Humanoid).options(undefer_group('details'),
+                                            joinedload(Humanoid.barcode).undefer_group('crypto'))
+    for bot in query:
+        bot.id, bot.name, bot.barcode.actual, bot.date_initiated
+        bool(len(bot.barcode.encryption_type)), bot.complaint
+    session.close()
+
+
+def many_to_many_workload(Session, size):
+    '''
+    d_1: humans sharing cats through hc_mapper, get_cats() for every human.
+    '''
+    Human, Cat = many_to_many.Human, many_to_many.Cat
+    session = Session()
+    cats = [Cat(name='cat %s' % i) for i in range(size)]
+    for i in range(size):
+        human = Human(name='human %s' % i)
+        # three cats each, fewer when there aren't three to tell apart
+        human.cats.extend([cats[(i + j) % size] for j in range(min(3, size))])
+        session.add(human)
+    session.commit()
+    for i in range(1, size + 1):
+        human_obj = session.query(Human).filter(Human.id == i).first()
+        for cat in human_obj.cats:
+            cat.id, cat.name
+    session.close()
+
+
+def association_object_workload(Session, size):
+    '''
+    e_1: humans and cars linked by HumanCarAssociation rows, the association
+    table dumped and every human's cars read through carsAssoc.
+    '''
+    Human, Car = association_object.Human, association_object.Car
+    HumanCarAssociation = association_object.HumanCarAssociation
+    session = Session()
+    humans = [Human(name='human %s' % i) for i in range(size)]
+    # at least two cars so the two links of a human never hit the same car
+    cars = [Car(model='car %s' % i) for i in range(size // 10 + 2)]
+    session.add_all(humans + cars)
+    session.commit()
+    session.add_all([HumanCarAssociation(human_id=human.id, car_id=cars[(i + j) % len(cars)].id)
+                     for i, human in enumerate(humans) for j in range(2)])
+    session.commit()
+    for assoc in session.query(HumanCarAssociation).all():
+        assoc.human_id, assoc.car_id
+    for human in humans:
+        for cars_assoc in human.carsAssoc:
+            cars_assoc.cars.model
+    session.close()
+
+
+# name -> (metadata to create, workload)
+WORKLOADS = {
+    'one_to_many': (one_to_many.Base.metadata, one_to_many_workload),
+    'many_to_one': (many_to_one.Base.metadata, many_to_one_workload),
+    'one_to_one': (one_to_one.Base.metadata, one_to_one_workload),
+    'many_to_many': (many_to_many.Base.metadata, many_to_many_workload),
+    'association_object': (association_object.Base.metadata, association_object_workload),
+}
@@ -0,0 +1,92 @@
+'''
+Benchmarks unlinking one cat from a human as the human's collection
+grows, with the regular list collection (load everything, then remove)
+and with the write only Human.cats from models/many_to_many_write_only.py.
+
+    python performance/write_only.py --sizes 100 1000 10000 100000
+'''
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, selectinload
+
+from bench import StatementCounter, print_table
+from models import many_to_many, many_to_many_write_only
+
+
+def build(models, size):
+    '''
+    One human with size cats, returns the engine.
+    '''
+    engine = create_engine('sqlite://')
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.Human.__table__.insert(), [dict(id=1, name='LibreLad')])
+        conn.execute(models.Cat.__table__.insert(), [dict(id=i, name='cat %s' % i) for i in range(1, size + 1)])
+        conn.execute(models.hc_mapper.insert(), [dict(human_id=1, cat_id=i) for i in range(1, size + 1)])
+    return engine
+
+
+def unlink_list(Session, cat_id):
+    '''
+    The d_5 way, the whole collection comes back before remove() can run.
+    '''
+    Human, Cat = many_to_many.Human, many_to_many.Cat
+    session = Session()
+    human_obj = session.get(Human, 1, options=[selectinload(Human.cats)])
+    human_obj.cats.remove(session.get(Cat, cat_id))
+    session.commit()
+    session.close()
+
+
+def unlink_write_only(Session, cat_id):
+    '''
+    remove() only records the change, the flush is one DELETE on hc_mapper.
+    '''
+    Human, Cat = many_to_many_write_only.Human, many_to_many_write_only.Cat
+    session = Session()
+    human_obj = session.get(Human, 1)
+    human_obj.cats.remove(session.get(Cat, cat_id))
+    session.commit()
+    session.close()
+
+
+MODES = (
+    ('list', many_to_many, unlink_list),
+    ('write_only', many_to_many_write_only, unlink_write_only),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--unlinks', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        cat_ids = random.Random(7).sample(range(1, size + 1), min(args.unlinks, size))
+        for mode, models, unlink in MODES:
+            engine = build(models, size)
+            Session = sessionmaker(bind=engine)
+            with StatementCounter(engine) as counter:
+                start = time.perf_counter()
+                for cat_id in cat_ids:
+                    unlink(Session, cat_id)
+                seconds = time.perf_counter() - start
+            session = Session()
+            remaining = many_to_many_write_only.count_cats(session, session.get(many_to_many_write_only.Human, 1)) \
+                if mode == 'write_only' else len(session.get(models.Human, 1).cats)
+            session.close()
+            assert remaining == size - len(cat_ids), (mode, remaining)
+            rows.append(dict(cats=size, mode=mode, ms_per_unlink=seconds * 1000 / len(cat_ids),
+                             statements_per_unlink=counter.count / float(len(cat_ids))))
+            engine.dispose()
+
+    print_table(rows, ['cats', 'mode', 'ms_per_unlink', 'statements_per_unlink'])
+
+
+if __name__ == '__main__':
+    main()
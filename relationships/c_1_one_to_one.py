@@ -77,7 +77,9 @@ def bot_info(bot_obj):
     print "===============++++===============\n"
 
 # lets access some data from the bot:
-boj = session.query(Humanoid).filter(Humanoid.complaint is not None).first()
+# `is not None` would be evaluated by python (always True), `!= None`
+# is what sqlalchemy turns into IS NOT NULL
+boj = session.query(Humanoid).filter(Humanoid.complaint != None).first()
 bot_info(boj)
 
 # safe test:
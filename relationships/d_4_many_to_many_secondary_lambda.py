@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime
+from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime, Index
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -39,8 +39,11 @@ session = Session()
 hc_mapper = Table(
     'hc_mapper',
     Base.metadata,
-    Column('human_id', ForeignKey('humans.id')),
-    Column('cat_id', ForeignKey('cats.id'))
+    # the composite primary key stops duplicate links and covers lookups
+    # by human_id, the reverse index covers lookups by cat_id (Cat.humans)
+    Column('human_id', ForeignKey('humans.id'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
 )
 
 # this creates the table after we have run the create_all method.
@@ -0,0 +1,78 @@
+from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime, Index
+from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+hc_mapper = Table(
+    'hc_mapper',
+    Base.metadata,
+    # the composite primary key stops duplicate links and covers lookups
+    # by human_id, the reverse index covers lookups by cat_id (Cat.humans)
+    Column('human_id', ForeignKey('humans.id'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+)
+
+class Human(Base):
+    __tablename__ = "humans"
+    id = Column(Integer, Sequence('human_seq'), primary_key=True)
+    name = Column(String)
+    # lazy="dynamic" turns human.cats into a query instead of a list,
+    # nothing is loaded until you ask for it and append/remove
+    # only record the change, so a crazy cat person with 100k cats
+    # can lose one without loading the other 99 999
+    cats = relationship('Cat', secondary="hc_mapper", lazy="dynamic")
+
+class Cat(Base):
+    __tablename__ = "cats"
+    id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+    name = Column(String)
+
+
+# create a sqlite database in memory, add kwarg echo=True to see the
+# raw SQL queries SQLA generates
+engine = create_engine('sqlite:///:memory:')
+
+# create all of the tables
+Base.metadata.create_all(bind=engine)
+
+# start session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+# create a human object and populate it with data
+libre = Human()
+libre.name = "LibreLad"
+
+# append works just like a list, but nothing gets loaded
+for i in range(100):
+    cat = Cat()
+    cat.name = "Cat No. %s" % i
+    libre.cats.append(cat)
+
+# add the object to the session
+session.add(libre)
+
+# commit the session to the DB
+session.commit()
+
+# count the cats in the database, not in python
+print "No. of cats: %s" % libre.cats.count()
+
+# page through the cats 10 at a time, slicing adds LIMIT/OFFSET
+for cat in libre.cats.order_by(Cat.id)[10:20]:
+    print "cat_id: %s | cat_name: %s" % (cat.id, cat.name)
+
+# remove one cat, the collection is never loaded and the flush
+# is a single DELETE against hc_mapper
+cat1 = session.query(Cat).filter(Cat.name == "Cat No. 0").first()
+libre.cats.remove(cat1)
+session.commit()
+
+print "No. of cats: %s" % libre.cats.count()
+print "No. of records in mapper: %s" % session.query(hc_mapper).count()
+
+# close the session
+session.close()
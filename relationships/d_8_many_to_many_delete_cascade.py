@@ -0,0 +1,86 @@
+from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime, Index, event
+from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+# base class for all of the models
+Base = declarative_base()
+
+hc_mapper = Table(
+    'hc_mapper',
+    Base.metadata,
+    # ondelete='CASCADE' lets the database remove the link rows
+    # when a human or a cat is deleted
+    Column('human_id', ForeignKey('humans.id', ondelete='CASCADE'), primary_key=True),
+    Column('cat_id', ForeignKey('cats.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_hc_mapper_cat_human', 'cat_id', 'human_id')
+)
+
+class Human(Base):
+    __tablename__ = "humans"
+    id = Column(Integer, Sequence('human_seq'), primary_key=True)
+    name = Column(String)
+    # passive_deletes=True tells the ORM to trust the ON DELETE CASCADE,
+    # so deleting a human doesn't load all of its cats just to
+    # delete their rows from the mapper table one by one
+    cats = relationship('Cat', secondary="hc_mapper", backref="humans", passive_deletes=True)
+
+class Cat(Base):
+    __tablename__ = "cats"
+    id = Column(Integer, Sequence('cat_seq'), primary_key=True)
+    name = Column(String)
+
+
+# create a sqlite database in memory and show me the raw sql queries(echo=True)
+engine = create_engine('sqlite:///:memory:')
+
+# sqlite ignores foreign keys (and ON DELETE CASCADE with them)
+# unless every connection switches them on
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+# create all of the tables
+Base.metadata.create_all(bind=engine)
+
+# start session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+# create a human object and populate it with data
+libre = Human()
+libre.name = "LibreLad"
+
+# relate a whole lot of cats to libre
+for i in range(1000):
+    cat = Cat()
+    cat.name = "Cat No. %s" % i
+    libre.cats.append(cat)
+
+# add the object to the session
+session.add(libre)
+
+# commit the session to the DB
+session.commit()
+
+print "No. of records in mapper: %s" % session.query(hc_mapper).count()
+
+# get human from db, notice that the cats are not loaded
+human_obj = session.query(Human).filter(Human.name == "LibreLad").first()
+
+# remove parent, this is a single DELETE FROM humans
+# and the database deletes the rows in the mapper
+session.delete(human_obj)
+session.commit()
+
+# lets see what the mapper table looks like
+print "No. of records in mapper: %s" % session.query(hc_mapper).count()
+
+# the cats are still there, they just have no human
+catz = session.query(Cat).filter(Cat.id == 1).first()
+print catz.name
+print catz.humans
+
+# close the session
+session.close()
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime, bindparam, Interval
+from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey, Sequence, String, func, DateTime, bindparam, Interval, Index
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.associationproxy import association_proxy
 
 # base class for all of the models
 Base = declarative_base()
@@ -10,13 +11,20 @@ class HumanCarAssociation(Base):
     HumanCarAssociation accesses the Car as Many to One
     '''
     __tablename__ = 'human_car_association'
+    # a human can only be linked to a car once, the unique index covers
+    # lookups by human_id and the reverse index covers lookups by car_id
+    __table_args__ = (
+        Index('ix_human_car_association_human_car', 'human_id', 'car_id', unique=True),
+        Index('ix_human_car_association_car_human', 'car_id', 'human_id'),
+    )
     id = Column(Integer, primary_key=True)
     datetime = Column(DateTime, default=func.now())
 
     human_id = Column(Integer, ForeignKey('humans.id'))
     car_id = Column(Integer, ForeignKey('cars.id'))
 
-    cars = relationship('Car')
+    cars = relationship('Car', back_populates='driversAssoc')
+    human = relationship('Human', back_populates='carsAssoc')
 
 class Human(Base):
     '''
@@ -25,16 +33,21 @@ class Human(Base):
     __tablename__ = 'humans'
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    carsAssoc = relationship('HumanCarAssociation')
+    carsAssoc = relationship('HumanCarAssociation', back_populates='human')
+    # skip the association object and get to the cars directly
+    cars = association_proxy('carsAssoc', 'cars', creator=lambda car: HumanCarAssociation(cars=car))
     e =  func.date_add(func.now(), bindparam('e', func.text('INTERVAL 5 day')))
 
 class Car(Base):
     '''
-    car needs no relationships, because of the Many to One relationships
+    car accesses the Association as a One to Many relationship
+    so it can tell who drives it
     '''
     __tablename__ = 'cars'
     id = Column(Integer, primary_key=True)
     model = Column(String)
+    driversAssoc = relationship('HumanCarAssociation', back_populates='cars')
+    drivers = association_proxy('driversAssoc', 'human', creator=lambda human: HumanCarAssociation(human=human))
 
 # create a sqlite database in memory and show me the raw sql queries(echo=True)
 engine = create_engine('sqlite:///:memory:')
@@ -77,9 +90,18 @@ for asses in assocs:
 for cars in person.carsAssoc:
     print cars.cars.model
 
-# get all people that drive the VW
-# drivers = session.query(Car).outerjoin(Car.id).filter(HumanCarAssociation.car_id == 1)
-# print drivers
+# the association proxy hides the association object
+for car_obj in person.cars:
+    print "%s drives a %s" % (person.name, car_obj.model)
+
+# get all people that drive the VW in a single query,
+# the reverse index on car_id keeps this from scanning the table
+drivers = session.query(Human).join(Human.carsAssoc).filter(HumanCarAssociation.car_id == car.id).all()
+for driver in drivers:
+    print "%s drives the %s" % (driver.name, car.model)
+
+# or walk the proxy from the car side (one query per driver)
+print [driver.name for driver in car.drivers]
 
 
 print person2.e